@@ -33,8 +33,8 @@ def load_raw_data() -> dict:
             data["permits"] = pd.read_parquet("data/raw/mtl_permits.parquet")
             logger.info(f"Loaded {len(data['permits'])} permit records")
         
-        if Path("data/raw/mtl_districts.geojson").exists():
-            data["districts"] = gpd.read_file("data/raw/mtl_districts.geojson")
+        if Path("data/raw/mtl_districts.parquet").exists():
+            data["districts"] = gpd.read_parquet("data/raw/mtl_districts.parquet")
             logger.info(f"Loaded {len(data['districts'])} districts")
         
         # Statistics Canada data
@@ -94,7 +94,7 @@ def calculate_construction_features(permits_df: pd.DataFrame, base_geo: gpd.GeoD
     
     try:
         # Aggregate permits by district
-        construction_features = permits_df.groupby("arrondissement").agg({
+        construction_features = permits_df.groupby("arrondissement", observed=True).agg({
             "valeur_travaux": ["sum", "mean", "count"],
             "is_residential": "sum",
             "is_new_construction": "sum",
@@ -118,13 +118,17 @@ def calculate_construction_features(permits_df: pd.DataFrame, base_geo: gpd.GeoD
         recent_date = permits_df["date_emission"].max() - timedelta(days=365)
         recent_permits = permits_df[permits_df["date_emission"] >= recent_date]
         
-        recent_features = recent_permits.groupby("arrondissement").agg({
+        recent_features = recent_permits.groupby("arrondissement", observed=True).agg({
             "valeur_travaux": "sum",
             "is_residential": "sum",
         }).reset_index()
         
         recent_features.columns = ["district_name", "recent_construction_value", "recent_residential_permits"]
         
+        # Permit labels may be categorical; merge and fill on plain strings
+        construction_features["district_name"] = construction_features["district_name"].astype(str)
+        recent_features["district_name"] = recent_features["district_name"].astype(str)
+        
         # Merge features
         features = construction_features.merge(recent_features, on="district_name", how="left")
         features.fillna(0, inplace=True)
@@ -5,6 +5,7 @@ Generates predictions for key metrics using time series models.
 """
 
 import json
+import functools
 import pandas as pd
 import numpy as np
 from pathlib import Path
@@ -14,6 +15,8 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 import warnings
 
+from frame_cache import FRAME_CACHE
+
 # Suppress sklearn warnings
 warnings.filterwarnings("ignore")
 
@@ -26,15 +29,25 @@ def setup_directories():
         Path(dir_name).mkdir(parents=True, exist_ok=True)
 
 def load_processed_data() -> dict:
-    """Load processed data for forecasting."""
+    """
+    Load processed data for forecasting.
+    Frames cached in-process by ingestion are used first; parquet files on
+    disk are the cold-start fallback.
+    """
     data = {}
     
     try:
-        if Path("data/raw/cmhc_rental.parquet").exists():
+        for key in ("rental", "housing_starts"):
+            cached = FRAME_CACHE.get(key)
+            if cached is not None and not cached.empty:
+                data[key] = cached
+                logger.info(f"Using in-process {key} data: {len(cached)} records")
+        
+        if "rental" not in data and Path("data/raw/cmhc_rental.parquet").exists():
             data["rental"] = pd.read_parquet("data/raw/cmhc_rental.parquet")
             logger.info(f"Loaded rental data: {len(data['rental'])} records")
         
-        if Path("data/raw/cmhc_housing_starts.parquet").exists():
+        if "housing_starts" not in data and Path("data/raw/cmhc_housing_starts.parquet").exists():
             data["housing_starts"] = pd.read_parquet("data/raw/cmhc_housing_starts.parquet")
             logger.info(f"Loaded housing starts data: {len(data['housing_starts'])} records")
         
@@ -65,7 +78,7 @@ def prepare_time_series_data(df: pd.DataFrame, value_col: str, date_col: str,
         # Group data if grouping columns provided
         if group_cols:
             grouped_series = {}
-            for group_vals, group_df in df.groupby(group_cols):
+            for group_vals, group_df in df.groupby(group_cols, observed=True):
                 if not isinstance(group_vals, tuple):
                     group_vals = (group_vals,)
                 
@@ -90,31 +103,64 @@ def prepare_time_series_data(df: pd.DataFrame, value_col: str, date_col: str,
         logger.error(f"Error preparing time series data: {e}")
         return {}
 
-def simple_trend_forecast(ts: pd.Series, horizon: int = 12) -> dict:
+@functools.lru_cache(maxsize=64)
+def _trend_projector(n: int) -> np.ndarray:
+    """
+    Least-squares projector for a linear trend over arange(n).
+    Series of the same length share it, so the pseudo-inverse is computed once.
+    """
+    return np.linalg.pinv(np.vander(np.arange(n, dtype=np.float64), 2)).astype(np.float32)
+
+@functools.lru_cache(maxsize=128)
+def _forecast_months(last_date: pd.Timestamp, horizon: int) -> tuple:
+    """Month labels ("YYYY-MM") for the horizon following last_date."""
+    forecast_dates = pd.date_range(
+        start=last_date + pd.DateOffset(months=1),
+        periods=horizon,
+        freq='MS'  # Month start
+    )
+    return tuple(forecast_dates.strftime("%Y-%m"))
+
+def _shared_forecast_months(ts_data: dict, horizon: int) -> Optional[List[str]]:
+    """
+    Forecast month labels shared by every series in ts_data, or None when
+    the series do not all end on the same date.
+    """
+    last_dates = {pd.Timestamp(ts.index.to_numpy()[-1]) for ts in ts_data.values()}
+    if len(last_dates) != 1:
+        return None
+    return list(_forecast_months(last_dates.pop(), horizon))
+
+def _round_list(values: np.ndarray) -> list:
+    """Round a forecast array to 2 dp at serialization time."""
+    return np.round(values.astype(np.float64), 2).tolist()
+
+def simple_trend_forecast(ts: pd.Series, horizon: int = 12,
+                          forecast_months: Optional[List[str]] = None) -> dict:
     """
     Simple trend-based forecasting using linear regression.
     Alternative to Prophet for environments where it's not available.
+    forecast_months may be precomputed by the caller when series share an end date.
     """
     try:
         if len(ts) < 3:
             return {"forecast": [], "confidence": 0.0}
         
         # Prepare data
-        y = np.asarray(ts.values, dtype=np.float64)
-        x = np.arange(len(y), dtype=np.float64)
+        y = np.asarray(ts.values, dtype=np.float32)
+        x = np.arange(len(y), dtype=np.float32)
         
         # Fit linear trend
-        coeffs = np.polyfit(x, y, 1)
-        trend = np.poly1d(coeffs)
+        slope, intercept = _trend_projector(len(y)) @ y
         
         # Calculate residuals for confidence intervals
-        fitted = trend(x)
+        fitted = slope * x + intercept
         residuals = y - fitted
         rmse = np.sqrt(np.mean(residuals**2))
         
         # Generate forecasts
-        forecast_x = np.arange(len(y), len(y) + horizon)
-        forecast_y = trend(forecast_x)
+        forecast_x = np.arange(len(y), len(y) + horizon, dtype=np.float32)
+        forecast_y = slope * forecast_x + intercept
         
         # Simple confidence intervals (±1.96 * RMSE)
         confidence_multiplier = 1.96
@@ -122,110 +168,97 @@ def simple_trend_forecast(ts: pd.Series, horizon: int = 12) -> dict:
         forecast_upper = forecast_y + confidence_multiplier * rmse
         
         # Create forecast periods
-        last_date = ts.index[-1]
-        # Ensure last_date is a pd.Timestamp, not a DatetimeIndex
-        if isinstance(last_date, pd.DatetimeIndex):
-            last_date = last_date[-1]
-        if not isinstance(last_date, pd.Timestamp):
-            last_date = pd.to_datetime(last_date)
-        # Ensure last_date is a scalar Timestamp for pd.date_range
-        if isinstance(last_date, pd.DatetimeIndex):
-            last_date = last_date[-1]
-        forecast_dates = pd.date_range(
-            start=last_date + pd.DateOffset(months=1),
-            periods=horizon,
-            freq='MS'  # Month start
-        )
+        if forecast_months is None:
+            last_date = pd.Timestamp(ts.index.to_numpy()[-1])
+            forecast_months = _forecast_months(last_date, horizon)
         
         # Format results
+        yhat = _round_list(forecast_y)
+        yhat_lower = _round_list(forecast_lower)
+        yhat_upper = _round_list(forecast_upper)
         forecast_results = []
-        for i, date in enumerate(forecast_dates):
+        for i, month in enumerate(forecast_months):
             forecast_results.append({
-                "month": date.strftime("%Y-%m"),
-                "yhat": round(forecast_y[i], 2),
-                "yhat_lower": round(forecast_lower[i], 2),
-                "yhat_upper": round(forecast_upper[i], 2)
+                "month": month,
+                "yhat": yhat[i],
+                "yhat_lower": yhat_lower[i],
+                "yhat_upper": yhat_upper[i]
             })
         
         # Calculate R-squared as confidence measure
         ss_res = np.sum(residuals ** 2)
         ss_tot = np.sum((y - np.mean(y)) ** 2)
-        r_squared = 1 - (ss_res / ss_tot) if ss_tot > 0 else 0
+        r_squared = float(1 - (ss_res / ss_tot)) if ss_tot > 0 else 0
         confidence = max(0.1, min(0.95, r_squared))
         
         return {
             "forecast": forecast_results,
             "confidence": round(confidence, 3),
             "model_type": "linear_trend",
-            "rmse": round(rmse, 2)
+            "rmse": round(float(rmse), 2)
         }
         
     except Exception as e:
         logger.error(f"Error in trend forecasting: {e}")
         return {"forecast": [], "confidence": 0.0}
 
-def seasonal_naive_forecast(ts: pd.Series, horizon: int = 12, season_length: int = 12) -> dict:
+def seasonal_naive_forecast(ts: pd.Series, horizon: int = 12, season_length: int = 12,
+                            forecast_months: Optional[List[str]] = None) -> dict:
     """
     Seasonal naive forecasting - repeats seasonal pattern from previous year.
     """
     try:
         if len(ts) < season_length:
-            return simple_trend_forecast(ts, horizon)
+            return simple_trend_forecast(ts, horizon, forecast_months)
         
         # Get last season pattern
-        last_season = ts.iloc[-season_length:].values
+        values = np.asarray(ts.values, dtype=np.float32)
+        last_season = values[-season_length:]
+        previous_season = values[-season_length*2:-season_length]
         
         # Calculate trend
         if len(ts) >= season_length * 2:
-            recent_avg = np.mean(ts.iloc[-season_length:])
-            previous_avg = np.mean(ts.iloc[-season_length*2:-season_length])
-            trend_factor = recent_avg / previous_avg if previous_avg > 0 else 1.0
+            recent_avg = last_season.mean()
+            previous_avg = previous_season.mean()
+            trend_factor = float(recent_avg / previous_avg) if previous_avg > 0 else 1.0
         else:
             trend_factor = 1.0
         
         # Generate forecasts by repeating seasonal pattern with trend
-        forecast_values = []
-        for i in range(horizon):
-            seasonal_value = last_season[i % season_length]
-            trend_adjusted = seasonal_value * (trend_factor ** (i // season_length + 1))
-            forecast_values.append(trend_adjusted)
+        steps = np.arange(horizon)
+        forecast_values = last_season[steps % season_length] * (
+            np.float32(trend_factor) ** (steps // season_length + 1)
+        )
         
         # Simple confidence intervals based on historical volatility
-        volatility = np.std(np.asarray(ts.values, dtype=np.float64))
+        volatility = values.std()
         confidence_multiplier = 1.96
         
         # Create forecast periods
-        last_date = ts.index[-1]
-        # Ensure last_date is a scalar Timestamp, not a tuple or DatetimeIndex
-        if isinstance(last_date, tuple):
-            last_date = last_date[-1]
-        if isinstance(last_date, pd.DatetimeIndex):
-            last_date = last_date[-1]
-        if not isinstance(last_date, pd.Timestamp):
-            last_date = pd.to_datetime(last_date)
-        forecast_dates = pd.date_range(
-            start=last_date + pd.DateOffset(months=1),
-            periods=horizon,
-            freq='MS'
-        )
+        if forecast_months is None:
+            last_date = pd.Timestamp(ts.index.to_numpy()[-1])
+            forecast_months = _forecast_months(last_date, horizon)
         
         # Format results
+        yhat = _round_list(forecast_values)
+        yhat_lower = _round_list(forecast_values - confidence_multiplier * volatility)
+        yhat_upper = _round_list(forecast_values + confidence_multiplier * volatility)
         forecast_results = []
-        for i, date in enumerate(forecast_dates):
-            yhat = forecast_values[i]
+        for i, month in enumerate(forecast_months):
             forecast_results.append({
-                "month": date.strftime("%Y-%m"),
-                "yhat": round(yhat, 2),
-                "yhat_lower": round(yhat - confidence_multiplier * volatility, 2),
-                "yhat_upper": round(yhat + confidence_multiplier * volatility, 2)
+                "month": month,
+                "yhat": yhat[i],
+                "yhat_lower": yhat_lower[i],
+                "yhat_upper": yhat_upper[i]
             })
         
         # Confidence based on pattern stability
         if len(ts) >= season_length * 2:
-            recent_pattern = np.asarray(ts.iloc[-season_length:].values, dtype=np.float64)
-            prev_pattern = np.asarray(ts.iloc[-season_length*2:-season_length].values, dtype=np.float64)
+            # corrcoef stays in float64 for numerical stability
+            recent_pattern = last_season.astype(np.float64)
+            prev_pattern = previous_season.astype(np.float64)
             pattern_correlation = np.corrcoef(recent_pattern, prev_pattern)[0, 1]
-            confidence = max(0.1, min(0.9, abs(pattern_correlation)))
+            confidence = max(0.1, min(0.9, float(abs(pattern_correlation))))
         else:
             confidence = 0.5
         
@@ -238,7 +271,7 @@ def seasonal_naive_forecast(ts: pd.Series, horizon: int = 12, season_length: int
         
     except Exception as e:
         logger.error(f"Error in seasonal naive forecasting: {e}")
-        return simple_trend_forecast(ts, horizon)
+        return simple_trend_forecast(ts, horizon, forecast_months)
 
 def forecast_rental_prices(rental_data: pd.DataFrame) -> dict:
     """Generate rental price forecasts by district and bedroom type."""
@@ -257,15 +290,16 @@ def forecast_rental_prices(rental_data: pd.DataFrame) -> dict:
         )
         
         forecasts = {}
+        forecast_months = _shared_forecast_months(ts_data, horizon=12)
         
         for group_key, ts in ts_data.items():
             district, bedroom_type = group_key
             
             # Choose forecasting method based on data length and seasonality
             if len(ts) >= 12:
-                forecast_result = seasonal_naive_forecast(ts, horizon=12)
+                forecast_result = seasonal_naive_forecast(ts, horizon=12, forecast_months=forecast_months)
             else:
-                forecast_result = simple_trend_forecast(ts, horizon=12)
+                forecast_result = simple_trend_forecast(ts, horizon=12, forecast_months=forecast_months)
             
             # Store forecast
             group_id = f"{district}_{bedroom_type}".replace(" ", "_").replace("+", "plus")
@@ -292,9 +326,9 @@ def forecast_vacancy_rates(rental_data: pd.DataFrame) -> dict:
         rental_data["date"] = pd.to_datetime(rental_data["year"].astype(str) + "-01-01")
         
         # Aggregate by district (average across bedroom types)
-        district_vacancy = rental_data.groupby(["district", "date"]).agg({
-            "vacancy_rate": "mean"
-        }).reset_index()
+        district_vacancy = rental_data.groupby(
+            ["district", "date"], sort=False, observed=True
+        )["vacancy_rate"].mean().reset_index()
         
         ts_data = prepare_time_series_data(
             district_vacancy,
@@ -304,12 +338,13 @@ def forecast_vacancy_rates(rental_data: pd.DataFrame) -> dict:
         )
         
         forecasts = {}
+        forecast_months = _shared_forecast_months(ts_data, horizon=12)
         
         for group_key, ts in ts_data.items():
             district = group_key[0] if isinstance(group_key, tuple) else group_key
             
             # Vacancy rates tend to be less seasonal, use trend forecast
-            forecast_result = simple_trend_forecast(ts, horizon=12)
+            forecast_result = simple_trend_forecast(ts, horizon=12, forecast_months=forecast_months)
             
             # Ensure vacancy rates stay within reasonable bounds (0-15%)
             for point in forecast_result.get("forecast", []):
@@ -337,9 +372,9 @@ def forecast_housing_starts(starts_data: pd.DataFrame) -> dict:
         logger.info("Generating housing starts forecasts...")
         
         # Monthly aggregation
-        monthly_starts = starts_data.groupby(["region", "date"]).agg({
-            "housing_starts": "sum"
-        }).reset_index()
+        monthly_starts = starts_data.groupby(
+            ["region", "date"], sort=False, observed=True
+        )["housing_starts"].sum().reset_index()
         
         ts_data = prepare_time_series_data(
             monthly_starts,
@@ -349,12 +384,15 @@ def forecast_housing_starts(starts_data: pd.DataFrame) -> dict:
         )
         
         forecasts = {}
+        forecast_months = _shared_forecast_months(ts_data, horizon=12)
         
         for group_key, ts in ts_data.items():
             region = group_key[0] if isinstance(group_key, tuple) else group_key
             
             # Housing starts are highly seasonal, use seasonal forecast
-            forecast_result = seasonal_naive_forecast(ts, horizon=12, season_length=12)
+            forecast_result = seasonal_naive_forecast(
+                ts, horizon=12, season_length=12, forecast_months=forecast_months
+            )
             
             # Ensure non-negative values
             for point in forecast_result.get("forecast", []):
@@ -375,14 +413,8 @@ def forecast_housing_starts(starts_data: pd.DataFrame) -> dict:
         logger.error(f"Error forecasting housing starts: {e}")
         return {}
 
-def main():
-    """Main forecasting pipeline."""
-    logger.info("Starting forecasting pipeline")
-    setup_directories()
-    
-    # Load processed data
-    data = load_processed_data()
-    
+def generate_forecasts(data: dict) -> dict:
+    """Generate all forecasts from loaded rental and housing starts data."""
     all_forecasts = {}
     
     # Generate rental price forecasts
@@ -402,7 +434,10 @@ def main():
         for key, forecast in starts_forecasts.items():
             all_forecasts[f"starts_{key}"] = forecast
     
-    # Save all forecasts
+    return all_forecasts
+
+def save_forecasts(all_forecasts: dict):
+    """Save forecasts and their summary to the curated directory."""
     with open("data/curated/forecasts.json", "w") as f:
         json.dump(all_forecasts, f, indent=2)
     
@@ -418,6 +453,19 @@ def main():
     
     with open("data/curated/forecast_summary.json", "w") as f:
         json.dump(forecast_summary, f, indent=2)
+
+def main():
+    """Main forecasting pipeline."""
+    logger.info("Starting forecasting pipeline")
+    setup_directories()
+    
+    # Load processed data
+    data = load_processed_data()
+    
+    all_forecasts = generate_forecasts(data)
+    
+    # Save all forecasts
+    save_forecasts(all_forecasts)
     
     logger.info(f"Forecasting completed - generated {len(all_forecasts)} forecasts")
 
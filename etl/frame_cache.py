@@ -0,0 +1,8 @@
+#!/usr/bin/env python3
+"""
+Process-level cache of frames produced by CMHC ingestion.
+Kept in its own module so that pipeline.py run as a script (__main__) and the
+modules importing the cache share a single dict.
+"""
+
+FRAME_CACHE: dict = {}
@@ -4,14 +4,20 @@ Ingest data from CMHC (Canada Mortgage and Housing Corporation).
 Downloads rental market data for Montreal.
 """
 
-import json
 import os
+import orjson
 import requests
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
 from datetime import datetime
+from typing import Optional
 import logging
 
+from frame_cache import FRAME_CACHE
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -24,17 +30,24 @@ def setup_directories():
     for dir_name in ["data/raw", "data/processed", "data/curated"]:
         Path(dir_name).mkdir(parents=True, exist_ok=True)
 
-def create_sample_rental_data() -> pd.DataFrame:
+def _write_columns_parquet(columns: dict, path: str):
+    """Write a dict of column arrays straight to parquet, bypassing pandas."""
+    table = pa.table(columns)
+    pq.write_table(table, path, compression="zstd", compression_level=3)
+
+def _dictionary_array(codes: np.ndarray, labels: list) -> pa.DictionaryArray:
+    """Dictionary-encoded string column from integer codes into labels."""
+    return pa.DictionaryArray.from_arrays(pa.array(codes, type=pa.int16()), pa.array(labels))
+
+def create_sample_rental_data(output_path: Optional[str] = None) -> pd.DataFrame:
     """
     Create sample rental market data.
     In production, would fetch from CMHC API or data files.
+    When output_path is given, the columns are also written to parquet directly.
     """
     try:
         logger.info("Creating sample CMHC rental data...")
         
-        # Sample data structure based on CMHC rental market survey
-        sample_data = []
-        
         # Montreal districts
         districts = [
             "Ahuntsic-Cartierville", "Anjou", "Côte-des-Neiges–Notre-Dame-de-Grâce",
@@ -44,38 +57,48 @@ def create_sample_rental_data() -> pd.DataFrame:
             "Rosemont–La Petite-Patrie", "Saint-Laurent", "Saint-Léonard", 
             "Verdun", "Ville-Marie", "Villeray–Saint-Michel–Parc-Extension"
         ]
+        bedroom_types = ["Bachelor", "1 Bedroom", "2 Bedroom", "3+ Bedroom"]
+        base_rents = np.array([900, 1200, 1600, 2100])
+        
+        # Generate data for last 3 years: one row per (year, district, bedroom_type)
+        years = np.array([2023, 2024, 2025])
+        n_districts, n_bedrooms = len(districts), len(bedroom_types)
+        year_arr = np.repeat(years, n_districts * n_bedrooms)
+        district_idx = np.tile(np.repeat(np.arange(n_districts), n_bedrooms), len(years))
+        bedroom_idx = np.tile(np.arange(n_bedrooms), len(years) * n_districts)
+        
+        # Simulate realistic Montreal rental data, with variation by district and year
+        district_hash = np.array([hash(d) for d in districts], dtype=np.int64)[district_idx]
+        universe_hash = np.array(
+            [[hash(f"{d}{b}") % 2000 for b in bedroom_types] for d in districts]
+        )[district_idx, bedroom_idx]
+        years_elapsed = year_arr - 2023
+        
+        district_multiplier = 1.0 + (district_hash % 100) / 1000
+        year_growth = years_elapsed * 0.05
+        avg_rent = base_rents[bedroom_idx] * district_multiplier * (1 + year_growth)
+        vacancy_rate = np.maximum(0.5, 4.0 - years_elapsed * 0.5 + (district_hash % 20) / 10)
         
-        # Generate data for last 3 years
-        for year in [2023, 2024, 2025]:
-            for district in districts:
-                for bedroom_type in ["Bachelor", "1 Bedroom", "2 Bedroom", "3+ Bedroom"]:
-                    # Simulate realistic Montreal rental data
-                    base_rent = {
-                        "Bachelor": 900,
-                        "1 Bedroom": 1200,
-                        "2 Bedroom": 1600,
-                        "3+ Bedroom": 2100
-                    }[bedroom_type]
-                    
-                    # Add variation by district and year
-                    district_multiplier = 1.0 + (hash(district) % 100) / 1000
-                    year_growth = (year - 2023) * 0.05
-                    
-                    avg_rent = base_rent * district_multiplier * (1 + year_growth)
-                    vacancy_rate = max(0.5, 4.0 - (year - 2023) * 0.5 + (hash(district) % 20) / 10)
-                    
-                    sample_data.append({
-                        "year": year,
-                        "district": district,
-                        "bedroom_type": bedroom_type,
-                        "average_rent": round(avg_rent, 0),
-                        "vacancy_rate": round(vacancy_rate, 2),
-                        "rental_universe": 1000 + (hash(f"{district}{bedroom_type}") % 2000),
-                        "rent_change_1yr": round((year - 2023) * 3.5 + (hash(district) % 10) - 5, 2),
-                        "survey_date": f"{year}-10-01"
-                    })
-        
-        df = pd.DataFrame(sample_data)
+        columns = {
+            "year": year_arr,
+            "district": np.array(districts, dtype=object)[district_idx],
+            "bedroom_type": np.array(bedroom_types, dtype=object)[bedroom_idx],
+            "average_rent": np.round(avg_rent, 0),
+            "vacancy_rate": np.round(vacancy_rate, 2),
+            "rental_universe": 1000 + universe_hash,
+            "rent_change_1yr": np.round(years_elapsed * 3.5 + (district_hash % 10) - 5, 2),
+            "survey_date": np.char.add(year_arr.astype(str), "-10-01").astype(object)
+        }
+        
+        if output_path:
+            _write_columns_parquet({
+                **columns,
+                "district": _dictionary_array(district_idx, districts),
+                "bedroom_type": _dictionary_array(bedroom_idx, bedroom_types)
+            }, output_path)
+            logger.info(f"Saved rental data to {output_path}")
+        
+        df = pd.DataFrame(columns)
         logger.info(f"Created {len(df)} rental market records")
         return df
         
@@ -83,55 +106,64 @@ def create_sample_rental_data() -> pd.DataFrame:
         logger.error(f"Error creating sample rental data: {e}")
         return pd.DataFrame()
 
-def create_sample_housing_starts() -> pd.DataFrame:
+def create_sample_housing_starts(output_path: Optional[str] = None) -> pd.DataFrame:
     """
     Create sample housing starts data.
     In production, would fetch from CMHC housing starts survey.
+    When output_path is given, the columns are also written to parquet directly.
     """
     try:
         logger.info("Creating sample housing starts data...")
         
-        sample_data = []
-        
         # Montreal regions
         regions = [
             "Montreal Island", "Laval", "North Shore", "South Shore", "Vaudreuil-Soulanges"
         ]
+        dwelling_types = ["Single", "Semi", "Row", "Apartment"]
+        base_starts = np.array([50, 30, 40, 200])
+        
+        # Generate monthly data for last 2 years: one row per (year, month, region, dwelling_type)
+        years = np.array([2024, 2025])
+        months = np.arange(1, 13)
+        n_regions, n_types = len(regions), len(dwelling_types)
+        per_month = n_regions * n_types
+        year_arr = np.repeat(years, len(months) * per_month)
+        month_arr = np.tile(np.repeat(months, per_month), len(years))
+        region_idx = np.tile(np.repeat(np.arange(n_regions), n_types), len(years) * len(months))
+        type_idx = np.tile(np.arange(n_types), len(years) * len(months) * n_regions)
+        
+        # Simulate seasonal patterns: construction season and winter slowdown
+        seasonal_factor = np.ones(13)
+        seasonal_factor[[5, 6, 7, 8, 9]] = 1.5
+        seasonal_factor[[12, 1, 2]] = 0.5
+        region_hash = np.array([hash(r) for r in regions], dtype=np.int64)[region_idx]
+        
+        starts = (
+            base_starts[type_idx] * seasonal_factor[month_arr] * (1 + (region_hash % 50) / 100)
+        ).astype(np.int64)
+        dates = ((year_arr - 1970) * 12 + month_arr - 1).astype("datetime64[M]").astype("datetime64[ns]")
+        is_rental = type_idx == dwelling_types.index("Apartment")
+        
+        columns = {
+            "year": year_arr,
+            "month": month_arr,
+            "date": dates,
+            "region": np.array(regions, dtype=object)[region_idx],
+            "dwelling_type": np.array(dwelling_types, dtype=object)[type_idx],
+            "housing_starts": starts,
+            "intended_market": np.where(is_rental, "Rental", "Ownership").astype(object)
+        }
         
-        # Generate monthly data for last 2 years
-        for year in [2024, 2025]:
-            for month in range(1, 13):
-                for region in regions:
-                    for dwelling_type in ["Single", "Semi", "Row", "Apartment"]:
-                        # Simulate seasonal patterns
-                        seasonal_factor = 1.0
-                        if month in [5, 6, 7, 8, 9]:  # Construction season
-                            seasonal_factor = 1.5
-                        elif month in [12, 1, 2]:  # Winter slowdown
-                            seasonal_factor = 0.5
-                        
-                        base_starts = {
-                            "Single": 50,
-                            "Semi": 30,
-                            "Row": 40,
-                            "Apartment": 200
-                        }[dwelling_type]
-                        
-                        starts = int(base_starts * seasonal_factor * (1 + (hash(region) % 50) / 100))
-                        
-                        sample_data.append({
-                            "year": year,
-                            "month": month,
-                            "date": f"{year}-{month:02d}-01",
-                            "region": region,
-                            "dwelling_type": dwelling_type,
-                            "housing_starts": starts,
-                            "intended_market": "Rental" if dwelling_type == "Apartment" else "Ownership"
-                        })
-        
-        df = pd.DataFrame(sample_data)
-        df["date"] = pd.to_datetime(df["date"])
+        if output_path:
+            _write_columns_parquet({
+                **columns,
+                "region": _dictionary_array(region_idx, regions),
+                "dwelling_type": _dictionary_array(type_idx, dwelling_types),
+                "intended_market": _dictionary_array(is_rental.astype(np.int16), ["Ownership", "Rental"])
+            }, output_path)
+            logger.info(f"Saved housing starts to {output_path}")
         
+        df = pd.DataFrame(columns)
         logger.info(f"Created {len(df)} housing starts records")
         return df
         
@@ -146,27 +178,34 @@ def process_cmhc_data(rental_df: pd.DataFrame, starts_df: pd.DataFrame) -> dict:
         
         # Process rental data
         if not rental_df.empty:
-            # Calculate market indicators
-            rental_summary = rental_df.groupby(["year", "district"]).agg({
-                "average_rent": "weighted_average",  # Would need proper weighting
-                "vacancy_rate": "mean",
-                "rent_change_1yr": "mean",
-                "rental_universe": "sum"
-            }).reset_index()
+            # Calculate market indicators, weighting rents by rental universe
+            rental_summary = rental_df.assign(
+                _rent_weighted=rental_df["average_rent"] * rental_df["rental_universe"]
+            ).groupby(["year", "district"], sort=False, observed=True).agg(
+                _rent_weighted=("_rent_weighted", "sum"),
+                vacancy_rate=("vacancy_rate", "mean"),
+                rent_change_1yr=("rent_change_1yr", "mean"),
+                rental_universe=("rental_universe", "sum")
+            )
+            rental_summary.insert(
+                0, "average_rent",
+                rental_summary.pop("_rent_weighted") / rental_summary["rental_universe"]
+            )
+            rental_summary = rental_summary.reset_index()
             
             processed["rental_market"] = rental_summary
         
         # Process housing starts data
         if not starts_df.empty:
             # Monthly totals
-            starts_monthly = starts_df.groupby(["year", "month", "region"]).agg({
-                "housing_starts": "sum"
-            }).reset_index()
+            starts_monthly = starts_df.groupby(
+                ["year", "month", "region"], sort=False, observed=True
+            )["housing_starts"].sum().reset_index()
             
             # Annual totals by type
-            starts_annual = starts_df.groupby(["year", "region", "dwelling_type"]).agg({
-                "housing_starts": "sum"
-            }).reset_index()
+            starts_annual = starts_df.groupby(
+                ["year", "region", "dwelling_type"], sort=False, observed=True
+            )["housing_starts"].sum().reset_index()
             
             processed["housing_starts_monthly"] = starts_monthly
             processed["housing_starts_annual"] = starts_annual
@@ -183,21 +222,20 @@ def main():
     logger.info("Starting CMHC data ingestion")
     setup_directories()
     
-    # Create sample data (replace with real CMHC API calls in production)
-    rental_df = create_sample_rental_data()
-    starts_df = create_sample_housing_starts()
+    # Create sample data (replace with real CMHC API calls in production),
+    # writing the raw parquet files straight from the generated columns
+    rental_df = create_sample_rental_data("data/raw/cmhc_rental.parquet")
+    starts_df = create_sample_housing_starts("data/raw/cmhc_housing_starts.parquet")
     
     # Process the data
     processed_data = process_cmhc_data(rental_df, starts_df)
     
-    # Save raw data
+    # Keep the raw frames in-process for forecasting
     if not rental_df.empty:
-        rental_df.to_parquet("data/raw/cmhc_rental.parquet", index=False)
-        logger.info("Saved rental data to data/raw/cmhc_rental.parquet")
+        FRAME_CACHE["rental"] = rental_df
     
     if not starts_df.empty:
-        starts_df.to_parquet("data/raw/cmhc_housing_starts.parquet", index=False)
-        logger.info("Saved housing starts to data/raw/cmhc_housing_starts.parquet")
+        FRAME_CACHE["housing_starts"] = starts_df
     
     # Save processed data
     for key, df in processed_data.items():
@@ -214,8 +252,9 @@ def main():
         "note": "Sample data for demonstration - replace with real CMHC data access"
     }
     
-    with open("data/raw/cmhc_summary.json", "w") as f:
-        json.dump(summary, f, indent=2)
+    Path("data/raw/cmhc_summary.json").write_bytes(
+        orjson.dumps(summary, option=orjson.OPT_INDENT_2)
+    )
     
     logger.info("CMHC data ingestion completed")
 
@@ -4,13 +4,26 @@ Ingest data from Ville de Montréal open data portal.
 Downloads construction permits, zoning data, and infrastructure data.
 """
 
-import json
 import os
+import re
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import ijson
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import geopandas as gpd
+import shapely
+from pyproj import Transformer
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from itertools import islice
 from pathlib import Path
-from datetime import datetime
+from datetime import date, datetime
+from typing import Any, Callable, Iterable, Iterator
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -24,20 +37,109 @@ DATASETS = {
     "zoning": "d0a7b8ec-6d7e-4e3c-8c8a-9b8a7c5d2b0a",    # Zonage (placeholder)
 }
 
+PERMITS_PATH = "data/raw/mtl_permits.parquet"
+DISTRICTS_PATH = "data/raw/mtl_districts.parquet"  # GeoParquet
+
+# Projected CRS for Montreal (NAD83 / MTM zone 8), in metres
+METRIC_CRS = "EPSG:32188"
+METRIC_TO_WGS84 = Transformer.from_crs(METRIC_CRS, "EPSG:4326", always_xy=True)
+
+# Number of permit features parsed into a DataFrame at a time
+PERMITS_CHUNK_SIZE = 50_000
+
+# Permit properties used downstream; other keys are never materialized
+PERMIT_COLUMNS = [
+    "DATE_EMISSION", "VALEUR_TRAVAUX", "ARRONDISSEMENT", "NATURE_TRAVAUX", "USAGE_PREDOMINANT"
+]
+# Raw properties are materialized directly as Arrow-backed strings; numeric parsing
+# happens on the cleaned columns, where malformed values are coerced to missing
+PERMIT_STRING_DTYPES = {col: "string[pyarrow]" for col in PERMIT_COLUMNS}
+PERMIT_LABEL_COLUMNS = ("arrondissement", "type_travaux", "usage")
+
+# Boolean flags derived from label columns: {column: {flag: pattern}}
+PERMIT_FLAG_PATTERNS = {
+    "usage": {"is_residential": "Résidentiel"},
+    "type_travaux": {"is_new_construction": "Construction"},
+}
+
+# Parquet schema of processed permits, fixed so every streamed chunk matches
+PERMITS_SCHEMA = pa.schema([
+    ("DATE_EMISSION", pa.string()),
+    ("VALEUR_TRAVAUX", pa.string()),
+    ("ARRONDISSEMENT", pa.string()),
+    ("NATURE_TRAVAUX", pa.string()),
+    ("USAGE_PREDOMINANT", pa.string()),
+    ("date_emission", pa.timestamp("ns")),
+    ("valeur_travaux", pa.float64()),
+    ("arrondissement", pa.dictionary(pa.int32(), pa.string())),
+    ("type_travaux", pa.dictionary(pa.int32(), pa.string())),
+    ("usage", pa.dictionary(pa.int32(), pa.string())),
+    ("year_month", pa.array(pd.array([], dtype="period[M]")).type),
+    ("is_residential", pa.bool_()),
+    ("is_new_construction", pa.bool_()),
+])
+
+# Shared HTTP session: keeps connections alive across requests to the same host
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
+))
+
+@lru_cache(maxsize=1)
 def setup_directories():
-    """Create necessary directories."""
+    """Create necessary directories (once per process)."""
     for dir_name in ["data/raw", "data/processed", "data/curated"]:
         Path(dir_name).mkdir(parents=True, exist_ok=True)
 
+def iter_geojson_features(response: requests.Response) -> Iterator[dict]:
+    """Incrementally parse GeoJSON features from a streamed response."""
+    response.raw.decode_content = True
+    try:
+        yield from ijson.items(response.raw, "features.item", use_float=True)
+    finally:
+        response.close()
+
+def iter_chunks(items: Iterable, size: int) -> Iterator[list]:
+    """Yield successive lists of at most size items."""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def category_flags(series: pd.Series, patterns: dict) -> dict:
+    """
+    Match several patterns against a categorical Series in one regex pass
+    per category, returning a boolean array per pattern name gathered
+    through the category codes.
+    """
+    names = list(patterns)
+    matcher = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in patterns.items()))
+    
+    # Trailing all-False row is indexed by code -1 (missing)
+    bitmap = np.zeros((len(series.cat.categories) + 1, len(names)), dtype=bool)
+    for i, label in enumerate(series.cat.categories):
+        for match in matcher.finditer(str(label)):
+            bitmap[i, names.index(match.lastgroup)] = True
+    
+    rows = bitmap[series.cat.codes.to_numpy()]
+    return {name: rows[:, j] for j, name in enumerate(names)}
+
 def fetch_montreal_dataset(dataset_id: str, format_type: str = "json") -> dict:
-    """Fetch dataset from Montreal Open Data API."""
+    """
+    Fetch dataset from Montreal Open Data API.
+    JSON datasets are streamed: "features" is a lazy iterator of feature dicts.
+    """
     try:
         # Get dataset metadata
         meta_url = f"{MTL_API_BASE}/package_show?id={dataset_id}"
-        meta_response = requests.get(meta_url, timeout=30)
+        meta_response = SESSION.get(meta_url, timeout=30)
         meta_response.raise_for_status()
         
-        metadata = meta_response.json()["result"]
+        metadata = orjson.loads(meta_response.content)["result"]
         
         # Find the appropriate resource
         resource = None
@@ -52,11 +154,11 @@ def fetch_montreal_dataset(dataset_id: str, format_type: str = "json") -> dict:
             
         # Download the data
         data_url = resource["url"]
-        data_response = requests.get(data_url, timeout=120)
+        data_response = SESSION.get(data_url, timeout=120, stream=True)
         data_response.raise_for_status()
         
         if format_type.lower() == "json":
-            return data_response.json()
+            return {"features": iter_geojson_features(data_response)}
         else:
             return {"content": data_response.content}
             
@@ -64,45 +166,105 @@ def fetch_montreal_dataset(dataset_id: str, format_type: str = "json") -> dict:
         logger.error(f"Error fetching dataset {dataset_id}: {e}")
         return {}
 
-def process_construction_permits(data: dict) -> pd.DataFrame:
-    """Process construction permits data."""
+@lru_cache(maxsize=None)
+def permits_cutoff(today: date) -> np.datetime64:
+    """Start of the three-year permits window, as a datetime64 for numpy comparison."""
+    return np.datetime64(pd.Timestamp(today) - pd.DateOffset(years=3), "ns")
+
+def process_permits_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """Clean and enrich one chunk of raw permit properties."""
+    # Clean and standardize columns
+    df["date_emission"] = pd.to_datetime(df["DATE_EMISSION"], errors="coerce")
+    df["valeur_travaux"] = pd.to_numeric(df["VALEUR_TRAVAUX"], errors="coerce")
+    df["arrondissement"] = df["ARRONDISSEMENT"].str.title()
+    df["type_travaux"] = df["NATURE_TRAVAUX"].str.title()
+    df["usage"] = df["USAGE_PREDOMINANT"].str.title()
+    
+    # Filter recent permits (last 3 years)
+    cutoff_date = permits_cutoff(datetime.now().date())
+    df = df.loc[df["date_emission"].to_numpy() >= cutoff_date].copy()
+    
+    # Low-cardinality labels are stored as categoricals
+    for col in PERMIT_LABEL_COLUMNS:
+        df[col] = df[col].astype("category")
+    
+    # Add derived features
+    df["year_month"] = df["date_emission"].dt.to_period("M")
+    for col, patterns in PERMIT_FLAG_PATTERNS.items():
+        for flag, values in category_flags(df[col], patterns).items():
+            df[flag] = values
+    
+    return df
+
+def iter_permits_chunks(data: dict) -> Iterator[pd.DataFrame]:
+    """Yield processed permit DataFrames, one per chunk of streamed features."""
+    for batch in iter_chunks(data.get("features", []), PERMITS_CHUNK_SIZE):
+        df = pd.DataFrame.from_records(
+            (feature["properties"] for feature in batch), columns=PERMIT_COLUMNS
+        ).astype(PERMIT_STRING_DTYPES)
+        yield process_permits_chunk(df)
+
+def write_construction_permits(data: dict, output_path: str) -> int:
+    """
+    Process construction permits chunk by chunk, streaming each chunk into
+    a parquet file so memory stays bounded by the chunk size.
+    Returns the number of permits written.
+    """
     if not data:
         logger.warning("No permits data available")
-        return pd.DataFrame()
+        return 0
     
+    # Written under a temporary name and moved into place only once complete, so a
+    # failed run leaves the previous file untouched
+    tmp_path = f"{output_path}.tmp"
+    writer = None
+    permits_count = 0
     try:
-        # Convert to DataFrame
-        df = pd.DataFrame(data.get("features", []))
+        for df in iter_permits_chunks(data):
+            if df.empty:
+                continue
+            if writer is None:
+                writer = pq.ParquetWriter(
+                    tmp_path, PERMITS_SCHEMA,
+                    compression="zstd",
+                    compression_level=3,
+                    use_dictionary=list(PERMIT_LABEL_COLUMNS),
+                    data_page_size=1 << 20
+                )
+            writer.write_table(pa.Table.from_pandas(df, schema=PERMITS_SCHEMA, preserve_index=False))
+            permits_count += len(df)
         
-        if df.empty:
+        if writer is None:
             logger.warning("Empty permits dataset")
-            return df
-            
-        # Extract properties
-        df = pd.json_normalize(df["properties"].tolist())
-        
-        # Clean and standardize columns
-        df["date_emission"] = pd.to_datetime(df.get("DATE_EMISSION", ""), errors="coerce")
-        df["valeur_travaux"] = pd.to_numeric(df.get("VALEUR_TRAVAUX", 0), errors="coerce")
-        df["arrondissement"] = df["ARRONDISSEMENT"].astype(str).str.title()
-        df["type_travaux"] = df["NATURE_TRAVAUX"].astype(str).str.title()
-        df["usage"] = df["USAGE_PREDOMINANT"].astype(str).str.title()
-        
-        # Filter recent permits (last 3 years)
-        cutoff_date = datetime.now().replace(year=datetime.now().year - 3)
-        df = df[df["date_emission"] >= cutoff_date]
-        
-        # Add derived features
-        df["year_month"] = df["date_emission"].dt.to_period("M")
-        df["is_residential"] = df["usage"].str.contains("Résidentiel", na=False)
-        df["is_new_construction"] = df["type_travaux"].str.contains("Construction", na=False)
-        
-        logger.info(f"Processed {len(df)} construction permits")
-        return df
+        else:
+            writer.close()
+            writer = None
+            os.replace(tmp_path, output_path)
+        logger.info(f"Processed {permits_count} construction permits")
+        return permits_count
         
     except Exception as e:
         logger.error(f"Error processing permits: {e}")
-        return pd.DataFrame()
+        return 0
+    
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def parallel_simplify(geoms: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Topology-preserving simplification split across threads.
+    GEOS releases the GIL inside shapely's vectorized functions.
+    """
+    n_chunks = max(1, min(os.cpu_count() or 1, len(geoms)))
+    chunks = np.array_split(geoms, n_chunks)
+    with ThreadPoolExecutor(max_workers=n_chunks) as executor:
+        simplified = list(executor.map(
+            lambda chunk: shapely.simplify(chunk, tolerance, preserve_topology=True), chunks
+        ))
+    return np.concatenate(simplified)
 
 def process_districts(data: dict) -> gpd.GeoDataFrame:
     """Process districts/boroughs geometries."""
@@ -111,7 +273,7 @@ def process_districts(data: dict) -> gpd.GeoDataFrame:
         return gpd.GeoDataFrame()
     
     try:
-        gdf = gpd.GeoDataFrame.from_features(data.get("features", []))
+        gdf = gpd.GeoDataFrame.from_features(data.get("features", []), crs="EPSG:4326")
         
         if gdf.empty:
             logger.warning("Empty districts dataset")
@@ -122,12 +284,18 @@ def process_districts(data: dict) -> gpd.GeoDataFrame:
         gdf["district_id"] = gdf.index.astype(str)
         
         # Simplify geometries for better performance
-        gdf["geometry"] = gdf["geometry"].simplify(tolerance=0.001, preserve_topology=True)
+        gdf["geometry"] = gpd.GeoSeries(
+            parallel_simplify(gdf.geometry.to_numpy(), tolerance=0.001),
+            index=gdf.index, crs=gdf.crs
+        )
         
-        # Calculate centroids and area
-        gdf["centroid_lon"] = gdf.geometry.centroid.x
-        gdf["centroid_lat"] = gdf.geometry.centroid.y
-        gdf["area_km2"] = gdf.geometry.area / 1_000_000  # Convert to km²
+        # Calculate centroids and area in a metric projection (MTM zone 8)
+        metric_geoms = gdf.geometry.to_crs(METRIC_CRS).to_numpy()
+        centroids = shapely.centroid(metric_geoms)
+        gdf["centroid_lon"], gdf["centroid_lat"] = METRIC_TO_WGS84.transform(
+            shapely.get_x(centroids), shapely.get_y(centroids)
+        )
+        gdf["area_km2"] = shapely.area(metric_geoms) / 1_000_000  # Convert to km²
         
         logger.info(f"Processed {len(gdf)} districts")
         return gdf
@@ -136,39 +304,55 @@ def process_districts(data: dict) -> gpd.GeoDataFrame:
         logger.error(f"Error processing districts: {e}")
         return gpd.GeoDataFrame()
 
+def fetch_and_process(dataset_name: str, process: Callable[[dict], Any]) -> Any:
+    """Fetch a Montreal dataset by name and run its processing function."""
+    return process(fetch_montreal_dataset(DATASETS[dataset_name], "json"))
+
 def main():
     """Main ingestion function."""
     logger.info("Starting Montreal data ingestion")
     setup_directories()
     
-    # Ingest construction permits
-    logger.info("Fetching construction permits...")
-    permits_data = fetch_montreal_dataset(DATASETS["permits"], "json")
-    permits_df = process_construction_permits(permits_data)
-    
-    if not permits_df.empty:
-        permits_df.to_parquet("data/raw/mtl_permits.parquet", index=False)
-        logger.info("Saved construction permits to data/raw/mtl_permits.parquet")
+    # Fetch construction permits and district boundaries concurrently.
+    # Features are streamed, so each task covers both download and parsing.
+    logger.info("Fetching construction permits and district boundaries...")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        permits_future = executor.submit(
+            fetch_and_process, "permits",
+            partial(write_construction_permits, output_path=PERMITS_PATH)
+        )
+        districts_future = executor.submit(fetch_and_process, "districts", process_districts)
+        
+        try:
+            permits_count = permits_future.result()
+        except Exception as e:
+            logger.error(f"Error ingesting construction permits: {e}")
+            permits_count = 0
+        
+        try:
+            districts_gdf = districts_future.result()
+        except Exception as e:
+            logger.error(f"Error ingesting district boundaries: {e}")
+            districts_gdf = gpd.GeoDataFrame()
     
-    # Ingest district boundaries
-    logger.info("Fetching district boundaries...")
-    districts_data = fetch_montreal_dataset(DATASETS["districts"], "json")
-    districts_gdf = process_districts(districts_data)
+    if permits_count:
+        logger.info(f"Saved construction permits to {PERMITS_PATH}")
     
     if not districts_gdf.empty:
-        districts_gdf.to_file("data/raw/mtl_districts.geojson", driver="GeoJSON")
-        logger.info("Saved districts to data/raw/mtl_districts.geojson")
+        districts_gdf.to_parquet(DISTRICTS_PATH, index=False, compression="zstd")
+        logger.info(f"Saved districts to {DISTRICTS_PATH}")
     
     # Create summary statistics
     summary = {
         "ingestion_date": datetime.now().isoformat(),
-        "permits_count": len(permits_df),
+        "permits_count": permits_count,
         "districts_count": len(districts_gdf),
         "data_sources": list(DATASETS.keys()),
     }
     
-    with open("data/raw/mtl_summary.json", "w") as f:
-        json.dump(summary, f, indent=2)
+    Path("data/raw/mtl_summary.json").write_bytes(
+        orjson.dumps(summary, option=orjson.OPT_INDENT_2)
+    )
     
     logger.info("Montreal data ingestion completed")
 
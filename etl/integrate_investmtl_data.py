@@ -6,12 +6,21 @@ Ce script prépare et intégre les données immobilières traitées
 dans l'API InvestMTL pour alimenter les prédictions et analyses.
 """
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
 import json
+import os
 import logging
 from pathlib import Path
 import sqlite3
+import subprocess
+import tempfile
+import argparse
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 # Configuration
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -22,14 +31,34 @@ PROCESSED_DIR = BASE_DIR / "data" / "processed"
 API_DIR = BASE_DIR / "api"
 
 class InvestMTLIntegrator:
-    def __init__(self):
+    def __init__(self, fast_load=False):
         self.db_path = API_DIR / "database.sqlite"
+        # Chargement initial via le CLI sqlite3 plutôt que le pilote Python
+        self.fast_load = fast_load
+        # Connexion unique, partagée par toutes les phases de l'intégration
+        self.conn = self._connect()
+        # Fichiers présents dans PROCESSED_DIR, relevés en un seul parcours
+        self.processed_files = (
+            {entry.name for entry in os.scandir(PROCESSED_DIR)} if PROCESSED_DIR.is_dir() else set()
+        )
         
+    def _connect(self):
+        """Ouvre une connexion SQLite configurée pour les chargements en masse"""
+        # Réglages propres à la connexion uniquement: le mode de journal de la
+        # base partagée avec l'API n'est pas modifié
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript("""
+            PRAGMA synchronous=NORMAL;
+            PRAGMA cache_size=-262144;
+            PRAGMA temp_store=MEMORY;
+        """)
+        return conn
+
     def create_real_estate_tables(self):
         """Crée les tables pour les données immobilières"""
         logger.info("🗃️ Création des tables immobilières")
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self.conn as conn:
             cursor = conn.cursor()
             
             # Table des unités d'évaluation
@@ -90,35 +119,122 @@ class InvestMTLIntegrator:
                 )
             ''')
             
+            # Index sur les colonnes filtrées et jointes par les endpoints API
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_eu_nom_rue '
+                           'ON evaluation_units(nom_rue)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_eu_year '
+                           'ON evaluation_units(annee_construction)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_iz_score '
+                           'ON investment_zones(investment_score DESC)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_md_type_region '
+                           'ON market_data(data_type, region)')
+            
             conn.commit()
             logger.info("✅ Tables créées avec succès")
 
+    @staticmethod
+    def _insert_rows(conn, table, df, truncate=False):
+        """Insère un DataFrame dans une table existante, en une seule transaction"""
+        columns = ', '.join(df.columns)
+        placeholders = ', '.join('?' * len(df.columns))
+        
+        conn.execute('BEGIN')
+        if truncate:
+            conn.execute(f'DELETE FROM {table}')
+        conn.executemany(
+            f'INSERT OR REPLACE INTO {table} ({columns}) VALUES ({placeholders})',
+            # Tableau structuré NumPy converti en tuples Python en une passe
+            df.to_records(index=False).tolist()
+        )
+        conn.commit()
+        
+        # Mettre à jour les statistiques du planificateur
+        conn.execute(f'ANALYZE {table}')
+
+    def _fast_load_rows(self, table, df):
+        """Remplace le contenu d'une table via `.import` CSV du CLI sqlite3, en une transaction"""
+        columns = ', '.join(df.columns)
+        # Les valeurs manquantes sont écrites comme champs vides dans le CSV
+        values = ', '.join(f"NULLIF({col}, '')" for col in df.columns)
+        staging = f'{table}_staging'
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_path = Path(tmp_dir) / f'{table}.csv'
+            df.to_csv(csv_path, index=False, header=False)
+            
+            script = f"""
+.bail on
+.timeout 5000
+BEGIN;
+DELETE FROM {table};
+DROP TABLE IF EXISTS {staging};
+CREATE TABLE {staging} AS SELECT {columns} FROM {table} WHERE 0;
+.import --csv "{csv_path}" {staging}
+INSERT OR REPLACE INTO {table} ({columns}) SELECT {values} FROM {staging};
+DROP TABLE {staging};
+COMMIT;
+ANALYZE {table};
+"""
+            result = subprocess.run(['sqlite3', str(self.db_path)], input=script,
+                                    capture_output=True, text=True)
+        
+        if result.returncode != 0:
+            raise RuntimeError(f"sqlite3 .import a échoué: {result.stderr.strip()}")
+
+    @staticmethod
+    def _sample_residential_units(parquet_file, wanted, limit, batch_size=50_000):
+        """Échantillon uniforme des logements, lu par lots (réservoir à clés aléatoires)"""
+        # Les libellés sont lus dictionnaire-encodés: le test de sous-chaîne
+        # porte sur les libellés distincts, puis est propagé par les codes
+        parquet_format = ds.ParquetFileFormat(
+            read_options={'dictionary_columns': ['LIBELLE_UTILISATION']}
+        )
+        dataset = ds.dataset(parquet_file, format=parquet_format)
+        # Projection avec renommage en minuscules, faite par le scanner Arrow
+        columns = {
+            name.lower(): ds.field(name) for name in dataset.schema.names if name.lower() in wanted
+        }
+        rng = np.random.default_rng(42)
+        
+        sample = pd.DataFrame(columns=list(columns))
+        keys = np.empty(0)
+        threshold = 1.0
+        for batch in dataset.to_batches(columns=columns, batch_size=batch_size):
+            labels = batch.column('libelle_utilisation')
+            matches = pc.match_substring(labels.dictionary, 'Logement').fill_null(False)
+            # Le code -1 (libellé manquant) désigne le False final
+            residential = np.append(matches.to_numpy(zero_copy_only=False), False)[
+                pc.fill_null(labels.indices, -1).to_numpy()
+            ]
+            
+            # Tirer les clés d'abord: seules les lignes résidentielles sous le
+            # seuil courant peuvent entrer dans l'échantillon et sont converties en pandas
+            batch_keys = rng.random(batch.num_rows)
+            selected = np.flatnonzero(residential & (batch_keys < threshold))
+            if selected.size == 0:
+                continue
+            chunk = batch.take(pa.array(selected)).to_pandas()
+            
+            # Garder les `limit` lignes aux plus petites clés aléatoires
+            sample = pd.concat([sample, chunk], ignore_index=True) if len(sample) else chunk
+            keys = np.concatenate([keys, batch_keys[selected]])
+            if len(sample) > limit:
+                keep = np.argpartition(keys, limit)[:limit]
+                sample, keys = sample.iloc[keep], keys[keep]
+                threshold = keys.max()
+        
+        return sample.reset_index(drop=True)
+
     def import_montreal_units(self, limit=50000):
         """Importe les unités d'évaluation de Montréal (échantillon)"""
         logger.info(f"🏠 Import des unités d'évaluation (max {limit:,})")
         
         parquet_file = PROCESSED_DIR / "montreal_evaluation_units.parquet"
-        if not parquet_file.exists():
+        if parquet_file.name not in self.processed_files:
             logger.error(f"❌ Fichier non trouvé: {parquet_file}")
             return
         
         try:
-            # Charger un échantillon des données
-            df = pd.read_parquet(parquet_file)
-            
-            # Filtrer les logements résidentiels uniquement
-            residential = df[df['LIBELLE_UTILISATION'].str.contains('Logement', na=False)].copy()
-            
-            # Prendre un échantillon représentatif
-            if len(residential) > limit:
-                residential = residential.sample(n=limit, random_state=42)
-            
-            logger.info(f"📊 {len(residential):,} unités résidentielles à importer")
-            
-            # Préparer les données pour l'insertion
-            residential_clean = residential.copy()
-            residential_clean.columns = [col.lower() for col in residential_clean.columns]
-            
             # Mapper les colonnes
             column_mapping = {
                 'id_uev': 'id',
@@ -126,7 +242,6 @@ class InvestMTLIntegrator:
                 'nombre_logement': 'nb_logements',
                 'no_arrond_ile_cum': 'arrondissement'
             }
-            residential_clean.rename(columns=column_mapping, inplace=True)
             
             # Sélectionner les colonnes nécessaires
             required_columns = [
@@ -136,15 +251,39 @@ class InvestMTLIntegrator:
                 'matricule83', 'superficie_terrain', 'superficie_batiment', 'arrondissement'
             ]
             
-            available_columns = [col for col in required_columns if col in residential_clean.columns]
-            residential_final = residential_clean[available_columns].copy()
+            # Lire uniquement les colonnes sources utiles, par lots
+            source_names = {col: src for src, col in column_mapping.items()}
+            wanted = {source_names.get(col, col) for col in required_columns}
+            residential = self._sample_residential_units(parquet_file, wanted, limit)
+            
+            logger.info(f"📊 {len(residential):,} unités résidentielles à importer")
             
-            # Renommer pour correspondre à la table
-            residential_final.rename(columns={'categorie_uef': 'categorie', 'matricule83': 'matricule'}, inplace=True)
+            # Préparer les données pour l'insertion; en copy-on-write, renommages et
+            # sélection partagent les données de l'échantillon jusqu'à la première écriture
+            with pd.option_context('mode.copy_on_write', True):
+                residential_clean = residential.rename(columns=column_mapping)
+                available_columns = [
+                    col for col in required_columns if col in residential_clean.columns
+                ]
+                
+                # Renommer pour correspondre à la table
+                residential_final = residential_clean[available_columns].rename(
+                    columns={'categorie_uef': 'categorie', 'matricule83': 'matricule'}
+                )
+                
+                # Réduire les colonnes entières au plus petit type qui les contient
+                for col in ('etages', 'nb_logements', 'annee_construction'):
+                    if col in residential_final.columns:
+                        residential_final[col] = pd.to_numeric(
+                            residential_final[col], errors='coerce', downcast='integer'
+                        )
             
             # Insérer dans la base de données
-            with sqlite3.connect(self.db_path) as conn:
-                residential_final.to_sql('evaluation_units', conn, if_exists='replace', index=False)
+            if self.fast_load:
+                self._fast_load_rows('evaluation_units', residential_final)
+            else:
+                with self.conn as conn:
+                    self._insert_rows(conn, 'evaluation_units', residential_final, truncate=True)
             
             logger.info(f"✅ {len(residential_final):,} unités importées")
             
@@ -156,7 +295,7 @@ class InvestMTLIntegrator:
         logger.info("🎯 Import des zones d'investissement")
         
         parquet_file = PROCESSED_DIR / "investment_zones.parquet"
-        if not parquet_file.exists():
+        if parquet_file.name not in self.processed_files:
             logger.error(f"❌ Fichier non trouvé: {parquet_file}")
             return
         
@@ -164,10 +303,6 @@ class InvestMTLIntegrator:
             df = pd.read_parquet(parquet_file)
             logger.info(f"📊 {len(df):,} zones d'investissement à importer")
             
-            # Préparer les données
-            df_clean = df.copy()
-            df_clean.columns = [col.lower() for col in df_clean.columns]
-            
             # Mapper les colonnes
             column_mapping = {
                 'nom_rue': 'street_name',
@@ -181,8 +316,6 @@ class InvestMTLIntegrator:
                 'etage_hors_sol_mean': 'avg_floors'
             }
             
-            df_clean.rename(columns=column_mapping, inplace=True)
-            
             # Sélectionner les colonnes
             required_columns = [
                 'street_name', 'property_count', 'total_units', 'avg_construction_year',
@@ -191,18 +324,71 @@ class InvestMTLIntegrator:
                 'modernity_score', 'size_score', 'investment_score'
             ]
             
-            available_columns = [col for col in required_columns if col in df_clean.columns]
-            df_final = df_clean[available_columns].copy()
+            # Préparer les données; en copy-on-write, renommages et sélection
+            # partagent les données du fichier lu au lieu de les copier
+            with pd.option_context('mode.copy_on_write', True):
+                df_clean = df.rename(columns=str.lower).rename(columns=column_mapping)
+                available_columns = [col for col in required_columns if col in df_clean.columns]
+                df_final = df_clean[available_columns]
             
             # Insérer dans la base
-            with sqlite3.connect(self.db_path) as conn:
-                df_final.to_sql('investment_zones', conn, if_exists='replace', index=False)
+            with self.conn as conn:
+                self._insert_rows(conn, 'investment_zones', df_final, truncate=True)
             
             logger.info(f"✅ {len(df_final):,} zones d'investissement importées")
             
         except Exception as e:
             logger.error(f"❌ Erreur lors de l'import: {e}")
 
+    def _prepare_market_file(self, filename, data_type):
+        """Lit et normalise un fichier de marché (sans écriture en base)"""
+        file_path = PROCESSED_DIR / filename
+        if filename not in self.processed_files:
+            logger.warning(f"⚠️ Fichier non trouvé: {filename}")
+            return None
+        
+        try:
+            df = pd.read_parquet(file_path)
+            logger.info(f"📊 {filename}: {len(df):,} lignes")
+            
+            # Résoudre les colonnes une seule fois par fichier
+            region_col = next((c for c in ('Région', 'Region', 'GEO') if c in df.columns), None)
+            period_col = next(
+                (c for c in ('Période', 'Period', 'REF_DATE') if c in df.columns), None
+            )
+            value_col = next(
+                (c for c in df.columns
+                 if any(keyword in c.lower()
+                        for keyword in ['valeur', 'value', 'nombre', 'number'])),
+                None
+            )
+            
+            if value_col is None:
+                return None
+            
+            # Garder les valeurs numériques
+            values = pd.to_numeric(df[value_col], errors='coerce')
+            valid = values.notna()
+            df = df[valid]
+            
+            # Colonnes passées en tableaux NumPy: pas d'alignement d'index,
+            # les constantes sont diffusées sur toute la longueur
+            n = len(df)
+            return pd.DataFrame({
+                'data_type': np.full(n, data_type, dtype=object),
+                'region': (df[region_col].astype(str).to_numpy() if region_col
+                           else np.full(n, 'Québec', dtype=object)),
+                'period': (df[period_col].astype(str).to_numpy() if period_col
+                           else np.full(n, '2024', dtype=object)),
+                'value': values[valid].to_numpy(dtype=float),
+                'unit': np.full(n, 'count', dtype=object),
+                'source': np.full(n, 'Statistique Canada', dtype=object)
+            })
+            
+        except Exception as e:
+            logger.error(f"❌ Erreur avec {filename}: {e}")
+            return None
+
     def import_market_data(self):
         """Importe les données de marché de Statistique Canada"""
         logger.info("📈 Import des données de marché")
@@ -214,54 +400,22 @@ class InvestMTLIntegrator:
             ('statistics_canada_Number of acts of financial difficulty.parquet', 'financial_difficulty')
         ]
         
+        # Lecture des fichiers en parallèle; les insertions restent sur un seul écrivain
+        with ThreadPoolExecutor(max_workers=len(market_files)) as executor:
+            prepared = list(executor.map(self._prepare_market_file, *zip(*market_files)))
+        
         total_imported = 0
         
-        for filename, data_type in market_files:
-            file_path = PROCESSED_DIR / filename
-            if not file_path.exists():
-                logger.warning(f"⚠️ Fichier non trouvé: {filename}")
+        for (filename, data_type), market_df in zip(market_files, prepared):
+            if market_df is None or market_df.empty:
                 continue
-                
+            
             try:
-                df = pd.read_parquet(file_path)
-                logger.info(f"📊 {filename}: {len(df):,} lignes")
-                
-                # Préparer les données pour l'insertion
-                market_records = []
+                with self.conn as conn:
+                    self._insert_rows(conn, 'market_data', market_df)
                 
-                for _, row in df.iterrows():
-                    # Extraire les informations pertinentes selon le type
-                    region = row.get('Région', row.get('Region', row.get('GEO', 'Québec')))
-                    period = row.get('Période', row.get('Period', row.get('REF_DATE', '2024')))
-                    
-                    # Trouver la colonne de valeur
-                    value_col = None
-                    for col in df.columns:
-                        if any(keyword in col.lower() for keyword in ['valeur', 'value', 'nombre', 'number']):
-                            value_col = col
-                            break
-                    
-                    if value_col is not None:
-                        value = row.get(value_col, 0)
-                        
-                        if pd.notna(value) and str(value).replace('.', '').isdigit():
-                            market_records.append({
-                                'data_type': data_type,
-                                'region': str(region),
-                                'period': str(period),
-                                'value': float(value),
-                                'unit': 'count',
-                                'source': 'Statistique Canada'
-                            })
-                
-                if market_records:
-                    market_df = pd.DataFrame(market_records)
-                    
-                    with sqlite3.connect(self.db_path) as conn:
-                        market_df.to_sql('market_data', conn, if_exists='append', index=False)
-                    
-                    total_imported += len(market_records)
-                    logger.info(f"✅ {len(market_records):,} enregistrements importés pour {data_type}")
+                total_imported += len(market_df)
+                logger.info(f"✅ {len(market_df):,} enregistrements importés pour {data_type}")
                 
             except Exception as e:
                 logger.error(f"❌ Erreur avec {filename}: {e}")
@@ -423,8 +577,14 @@ export async function searchProperties(request: Request, env: Env): Response {
         endpoints_file = API_DIR / "src" / "real-estate-endpoints.ts"
         endpoints_file.parent.mkdir(exist_ok=True)
         
-        with open(endpoints_file, 'w', encoding='utf-8') as f:
-            f.write(api_code)
+        # Ne réécrire que si le contenu change, pour préserver le mtime
+        # (et les caches de build TypeScript en aval)
+        new_content = api_code.encode('utf-8')
+        if endpoints_file.exists() and endpoints_file.read_bytes() == new_content:
+            logger.info(f"🚀 Code API inchangé: {endpoints_file}")
+            return
+        
+        endpoints_file.write_bytes(new_content)
         
         logger.info(f"🚀 Code API généré: {endpoints_file}")
 
@@ -445,17 +605,12 @@ export async function searchProperties(request: Request, env: Env): Response {
             self.generate_api_endpoints()
             
             # 4. Vérifier les données importées
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                cursor.execute("SELECT COUNT(*) FROM evaluation_units")
-                units_count = cursor.fetchone()[0]
-                
-                cursor.execute("SELECT COUNT(*) FROM investment_zones")
-                zones_count = cursor.fetchone()[0]
-                
-                cursor.execute("SELECT COUNT(*) FROM market_data")
-                market_count = cursor.fetchone()[0]
+            with self.conn as conn:
+                units_count, zones_count, market_count = conn.execute("""
+                    SELECT (SELECT COUNT(*) FROM evaluation_units),
+                           (SELECT COUNT(*) FROM investment_zones),
+                           (SELECT COUNT(*) FROM market_data)
+                """).fetchone()
             
             logger.info(f"\n✅ INTÉGRATION RÉUSSIE")
             logger.info(f"🏠 Unités d'évaluation: {units_count:,}")
@@ -466,9 +621,18 @@ export async function searchProperties(request: Request, env: Env): Response {
         except Exception as e:
             logger.error(f"❌ Erreur lors de l'intégration: {e}")
             raise
+        finally:
+            self.conn.close()
 
 def main():
-    integrator = InvestMTLIntegrator()
+    parser = argparse.ArgumentParser(
+        description="Intégration des données immobilières dans InvestMTL"
+    )
+    parser.add_argument('--fast-load', action='store_true',
+                        help="Charger les unités d'évaluation via le CLI sqlite3 (import CSV)")
+    args = parser.parse_args()
+    
+    integrator = InvestMTLIntegrator(fast_load=args.fast_load)
     integrator.run_integration()
 
 if __name__ == "__main__":
@@ -0,0 +1,63 @@
+"""
+Feature engineering shared by the price and rent predictors
+Both models derive the same base features from a property frame
+"""
+
+import pandas as pd
+import numpy as np
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+BASE_FEATURES = [
+    'superficie_terrain',
+    'superficie_batiment',
+    'nb_logements',
+    'annee_construction',
+    'etages'
+]
+
+def bucket_one_hot(values: np.ndarray, edges: List[float]) -> np.ndarray:
+    """One-hot matrix of right-closed buckets split at `edges`; NaN rows stay all zero"""
+    values = np.asarray(values, dtype=float)
+    one_hot = np.eye(len(edges) + 1, dtype=np.int8)[np.searchsorted(edges, values)]
+    one_hot[np.isnan(values)] = 0
+    return one_hot
+
+
+def base_features(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Base columns plus the derived features common to both models, as arrays"""
+    # Derived ratios are computed in float64 whatever the (possibly narrow) input dtypes
+    arrs = {col: df[col].to_numpy(dtype=np.float64) for col in BASE_FEATURES}
+
+    arrs['age'] = 2025 - arrs['annee_construction']
+    arrs['units_per_floor'] = arrs['nb_logements'] / (arrs['etages'] + 1)
+    arrs['area_per_unit'] = arrs['superficie_batiment'] / (arrs['nb_logements'] + 1)
+    arrs['lot_coverage'] = arrs['superficie_batiment'] / (arrs['superficie_terrain'] + 1)
+
+    # Small (<= 3 units), medium (<= 12) and large buildings
+    arrs['building_size'] = bucket_one_hot(arrs['nb_logements'], [3, 12])
+
+    return arrs
+
+
+def bucket_index(value: float, edges: List[float]) -> Optional[int]:
+    """Scalar counterpart of bucket_one_hot: the bucket holding `value`, None for NaN"""
+    if np.isnan(value):
+        return None
+    return bisect_left(edges, value)
+
+
+def base_record_features(record: Dict) -> Dict[str, float]:
+    """Scalar counterpart of base_features for a single property given as a dict"""
+    vals = {
+        col: np.float64(np.nan if record.get(col) is None else record[col])
+        for col in BASE_FEATURES
+    }
+
+    vals['age'] = 2025 - vals['annee_construction']
+    vals['units_per_floor'] = vals['nb_logements'] / (vals['etages'] + 1)
+    vals['area_per_unit'] = vals['superficie_batiment'] / (vals['nb_logements'] + 1)
+    vals['lot_coverage'] = vals['superficie_batiment'] / (vals['superficie_terrain'] + 1)
+
+    vals['building_size'] = bucket_index(vals['nb_logements'], [3, 12])
+    return vals
@@ -6,87 +6,96 @@ Predicts monthly rent based on property characteristics
 import pandas as pd
 import numpy as np
 import xgboost as xgb
-from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.preprocessing import LabelEncoder, StandardScaler
+from sklearn.model_selection import train_test_split, KFold
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-import joblib
 import json
+import os
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime
 import logging
 
+from ml.models._feature_base import (
+    BASE_FEATURES, base_features, base_record_features, bucket_index, bucket_one_hot
+)
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Physical core count (assuming 2-way SMT); XGBoost's thread scaling degrades past it
+XGB_THREADS = max(1, (os.cpu_count() or 2) // 2)
+
+
 class RentPredictor:
     """XGBoost model for predicting monthly rent"""
     
     def __init__(self, model_version: str = "v1.0.0"):
         self.model = None
-        self.scaler = StandardScaler()
-        self.label_encoders = {}
+        self.category_levels = {}
+        self.imputation_medians = {}
         self.feature_names = []
         self.model_version = model_version
         self.training_date = None
         self.performance_metrics = {}
+        self._rng = np.random.default_rng(42)
+        self._sorted_importance = {}
         
     def prepare_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """Prepare and engineer features for rent prediction"""
         
-        data = df.copy()
-        
-        # Basic features
-        features = [
-            'superficie_terrain',
-            'superficie_batiment', 
-            'nb_logements',
-            'annee_construction',
-            'etages'
-        ]
+        # Base columns and shared derived features
+        features = list(BASE_FEATURES)
+        base = base_features(df)
+        arrs = {col: base[col] for col in features}
         
         # Derived features for rent prediction
-        data['age'] = 2025 - data['annee_construction']
-        data['avg_unit_size'] = data['superficie_batiment'] / (data['nb_logements'] + 1)
-        data['units_per_floor'] = data['nb_logements'] / (data['etages'] + 1)
-        data['lot_coverage'] = data['superficie_batiment'] / (data['superficie_terrain'] + 1)
+        arrs['age'] = base['age']
+        arrs['avg_unit_size'] = base['area_per_unit']
+        arrs['units_per_floor'] = base['units_per_floor']
+        arrs['lot_coverage'] = base['lot_coverage']
         
         # Age categories (newer = higher rent)
-        data['is_very_new'] = (data['age'] <= 5).astype(int)
-        data['is_new'] = ((data['age'] > 5) & (data['age'] <= 15)).astype(int)
-        data['is_modern'] = ((data['age'] > 15) & (data['age'] <= 30)).astype(int)
-        data['is_older'] = (data['age'] > 30).astype(int)
+        age_buckets = bucket_one_hot(arrs['age'], [5, 15, 30])
+        for i, name in enumerate(['is_very_new', 'is_new', 'is_modern', 'is_older']):
+            arrs[name] = age_buckets[:, i]
         
         # Unit size categories (larger units = higher rent)
-        data['is_small_units'] = (data['avg_unit_size'] <= 60).astype(int)
-        data['is_medium_units'] = ((data['avg_unit_size'] > 60) & (data['avg_unit_size'] <= 100)).astype(int)
-        data['is_large_units'] = (data['avg_unit_size'] > 100).astype(int)
+        unit_size_buckets = bucket_one_hot(arrs['avg_unit_size'], [60, 100])
+        for i, name in enumerate(['is_small_units', 'is_medium_units', 'is_large_units']):
+            arrs[name] = unit_size_buckets[:, i]
         
         # Building type
-        data['is_duplex_triplex'] = (data['nb_logements'] <= 3).astype(int)
-        data['is_small_apartment'] = ((data['nb_logements'] > 3) & (data['nb_logements'] <= 12)).astype(int)
-        data['is_large_apartment'] = (data['nb_logements'] > 12).astype(int)
+        for i, name in enumerate(['is_duplex_triplex', 'is_small_apartment', 'is_large_apartment']):
+            arrs[name] = base['building_size'][:, i]
         
         # Handle categorical features
         categorical_features = ['libelle_utilisation']
         
         for col in categorical_features:
-            if col in data.columns:
-                # Group rare categories
-                value_counts = data[col].value_counts()
-                rare_categories = value_counts[value_counts < 50].index.tolist()
-                for rare_cat in rare_categories:
-                    data.loc[data[col] == rare_cat, col] = 'Autre'
-                
-                # Label encode
-                if col not in self.label_encoders:
-                    self.label_encoders[col] = LabelEncoder()
-                    data[f'{col}_encoded'] = self.label_encoders[col].fit_transform(data[col].fillna('Unknown'))
+            if col in df.columns:
+                # Plain labels: a category-dtype column would reject 'Autre'/'Unknown'
+                labels = df[col].astype(object)
+                if col not in self.category_levels:
+                    # Group rare categories
+                    value_counts = labels.value_counts()
+                    rare_categories = value_counts.index[value_counts.to_numpy() < 50]
+                    labels = labels.where(~labels.isin(rare_categories), 'Autre')
+                    
+                    # Categorical dtype, consumed natively by XGBoost; 'Autre' is
+                    # always a level so unseen values have a home at prediction time
+                    encoded = pd.Categorical(labels.fillna('Unknown'))
+                    if 'Autre' not in encoded.categories:
+                        encoded = encoded.add_categories('Autre')
+                    self.category_levels[col] = encoded.categories.tolist()
+                    arrs[f'{col}_encoded'] = encoded
                 else:
-                    # Handle unseen categories
-                    known_categories = set(self.label_encoders[col].classes_)
-                    data[col] = data[col].apply(lambda x: x if x in known_categories else 'Unknown')
-                    data[f'{col}_encoded'] = self.label_encoders[col].transform(data[col].fillna('Unknown'))
+                    # Same levels as training; unseen (and training-rare) values become 'Autre'
+                    encoded = pd.Categorical(
+                        labels.fillna('Unknown'), categories=self.category_levels[col]
+                    )
+                    arrs[f'{col}_encoded'] = encoded.fillna('Autre')
+        
+        data = pd.DataFrame(arrs, index=df.index, copy=False)
         
         # Select final features
         final_features = features + [
@@ -98,21 +107,33 @@ class RentPredictor:
         
         # Add categorical features
         for col in categorical_features:
-            if col in data.columns:
+            if col in df.columns:
                 final_features.append(f'{col}_encoded')
         
         # Keep only available features
         final_features = [f for f in final_features if f in data.columns]
         
-        # Fill missing values
-        for col in final_features:
-            if data[col].dtype in ['float64', 'int64']:
-                data[col] = data[col].fillna(data[col].median())
-            else:
-                data[col] = data[col].fillna(0)
+        # Fill missing values; medians are fitted on the first call and reused
+        # at prediction time
+        numeric_features = [
+            col for col in final_features if data[col].dtype in ['float64', 'int64']
+        ]
+        if not self.imputation_medians:
+            self.imputation_medians = data[numeric_features].median().to_dict()
+        data = data.fillna(self.imputation_medians)
+        other_features = [
+            col for col in final_features
+            if col not in numeric_features and data[col].dtype != 'category'
+        ]
+        data[other_features] = data[other_features].fillna(0)
         
         self.feature_names = final_features
-        return data[final_features]
+        
+        # Continuous features go to XGBoost as float32; int8 bucket flags and the
+        # categorical column keep their compact dtypes
+        return data[final_features].astype(
+            {col: np.float32 for col in numeric_features}, copy=False
+        )
     
     def create_target_variable(self, df: pd.DataFrame) -> pd.Series:
         """Create synthetic monthly rent target variable"""
@@ -130,43 +151,48 @@ class RentPredictor:
         avg_unit_size = df['superficie_batiment'] / (df['nb_logements'] + 1)
         
         # Classify units
-        unit_type = np.where(avg_unit_size <= 40, 'studio',
-                    np.where(avg_unit_size <= 60, '1_bedroom', 
-                    np.where(avg_unit_size <= 85, '2_bedroom',
-                    np.where(avg_unit_size <= 120, '3_bedroom', 'large'))))
-        
-        # Base rent
-        base_rent = np.array([base_monthly_rent[ut] for ut in unit_type])
-        
-        # Age adjustment (newer = higher rent)
-        age_factor = np.where(df['annee_construction'] >= 2015, 1.25,
-                     np.where(df['annee_construction'] >= 2010, 1.15,
-                     np.where(df['annee_construction'] >= 2000, 1.05,
-                     np.where(df['annee_construction'] >= 1990, 1.0,
-                     np.where(df['annee_construction'] >= 1980, 0.95, 0.85)))))
-        
-        # Building type adjustment
-        building_factor = np.where(df['nb_logements'] <= 3, 1.1,  # Duplex/triplex premium
-                          np.where(df['nb_logements'] <= 12, 1.0,  # Small apartment
-                          0.95))  # Large apartment discount
+        unit_idx = np.searchsorted([40, 60, 85, 120], avg_unit_size.to_numpy(dtype=float))
+        base_rent = np.array(list(base_monthly_rent.values()))
         
-        # Location factor (simplified)
-        location_factor = np.random.normal(1.0, 0.2, len(df))
-        location_factor = np.clip(location_factor, 0.7, 1.4)
+        # Age adjustment (newer = higher rent; missing years fall in the oldest bucket)
+        annee = df['annee_construction'].to_numpy(dtype=float)
+        age_idx = np.searchsorted([1980, 1990, 2000, 2010, 2015], annee, side='right')
+        age_idx[np.isnan(annee)] = 0
+        age_factor = np.array([0.85, 0.95, 1.0, 1.05, 1.15, 1.25])
+        
+        # Building type adjustment: duplex/triplex premium, small apartment,
+        # large apartment discount
+        building_idx = np.searchsorted([3, 12], df['nb_logements'].to_numpy(dtype=float))
+        building_factor = np.array([1.1, 1.0, 0.95])
         
-        # Calculate rent per unit
-        rent_per_unit = base_rent * age_factor * building_factor * location_factor
+        # Location factor (simplified)
+        location_factor = np.empty(len(df), dtype=np.float32)
+        self._rng.standard_normal(dtype=np.float32, out=location_factor)
+        location_factor *= 0.2
+        location_factor += 1.0
+        np.clip(location_factor, 0.7, 1.4, out=location_factor)
+        
+        # Calculate rent per unit: one gather from the combined unit x age x building table
+        rent_table = np.multiply.outer(
+            np.multiply.outer(base_rent, age_factor), building_factor
+        ).astype(np.float32)
+        rent_per_unit = rent_table[unit_idx, age_idx, building_idx]
+        rent_per_unit *= location_factor
         
         # Add noise
-        noise = np.random.normal(0, rent_per_unit * 0.08)
-        rent_per_unit += noise
+        noise = np.empty(len(df), dtype=np.float32)
+        self._rng.standard_normal(dtype=np.float32, out=noise)
+        noise *= 0.08
+        noise += 1.0
+        rent_per_unit *= noise
         
         # Ensure positive values
         rent_per_unit = np.maximum(rent_per_unit, 800)
         
         return pd.Series(rent_per_unit, index=df.index)
     
-    def train(self, df: pd.DataFrame, test_size: float = 0.2) -> Dict:
+    def train(self, df: pd.DataFrame, test_size: float = 0.2,
+              params: Optional[Dict] = None) -> Dict:
         """Train the rent prediction model"""
         
         logger.info(f"Training rent prediction model on {len(df)} samples")
@@ -175,15 +201,17 @@ class RentPredictor:
         X = self.prepare_features(df)
         y = self.create_target_variable(df)
         
+        # Hand XGBoost one contiguous float32 matrix instead of a DataFrame it would
+        # re-validate column by column; categorical columns are flagged through feature_types
+        feature_types = ['c' if X[col].dtype == 'category' else 'q' for col in X.columns]
+        X_arr = self._feature_matrix(X)
+        y_arr = y.to_numpy(dtype=np.float32)
+        
         # Split data
         X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=test_size, random_state=42
+            X_arr, y_arr, test_size=test_size, random_state=42
         )
         
-        # Scale features
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        X_test_scaled = self.scaler.transform(X_test)
-        
         # Train XGBoost model with parameters optimized for rent prediction
         self.model = xgb.XGBRegressor(
             n_estimators=250,
@@ -193,30 +221,65 @@ class RentPredictor:
             colsample_bytree=0.8,
             reg_alpha=0.1,
             reg_lambda=0.1,
+            tree_method="hist",
+            max_bin=256,
+            enable_categorical=True,
+            feature_types=feature_types,
+            grow_policy="depthwise",
             random_state=42,
-            n_jobs=-1
+            n_jobs=XGB_THREADS,
+            early_stopping_rounds=25
         )
+        if params:
+            # Tuned hyperparameters override the defaults above
+            self.model.set_params(**params)
+        
+        # Stop adding trees once the loss on a validation slice of the training data stops
+        # improving; the test split stays untouched until final scoring
+        X_fit, X_val, y_fit, y_val = train_test_split(
+            X_train, y_train, test_size=0.15, random_state=42
+        )
+        self.model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False)
         
-        self.model.fit(X_train_scaled, y_train)
+        # Cross-validate on slices of one DMatrix rather than refitting the sklearn wrapper
+        dtrain = xgb.DMatrix(
+            X_train, label=y_train, feature_types=feature_types, enable_categorical=True
+        )
+        booster_params = {k: v for k, v in self.model.get_xgb_params().items() if v is not None}
+        cv_scores = []
+        for fold_train, fold_test in KFold(n_splits=5).split(X_train):
+            booster = xgb.train(
+                booster_params, dtrain.slice(fold_train),
+                num_boost_round=self.model.best_iteration + 1
+            )
+            cv_scores.append(r2_score(y_train[fold_test], booster.predict(dtrain.slice(fold_test))))
         
         # Evaluate model
-        train_pred = self.model.predict(X_train_scaled)
-        test_pred = self.model.predict(X_test_scaled)
+        train_pred = self.model.predict(X_train)
+        test_pred = self.model.predict(X_test)
         
         # Calculate metrics
         self.performance_metrics = {
-            'train_mae': mean_absolute_error(y_train, train_pred),
-            'test_mae': mean_absolute_error(y_test, test_pred),
-            'train_rmse': np.sqrt(mean_squared_error(y_train, train_pred)),
-            'test_rmse': np.sqrt(mean_squared_error(y_test, test_pred)),
-            'train_r2': r2_score(y_train, train_pred),
-            'test_r2': r2_score(y_test, test_pred),
-            'cv_score': cross_val_score(self.model, X_train_scaled, y_train, cv=5).mean(),
-            'mean_rent': y.mean(),
-            'median_rent': y.median()
+            'train_mae': float(mean_absolute_error(y_train, train_pred)),
+            'test_mae': float(mean_absolute_error(y_test, test_pred)),
+            'train_rmse': float(np.sqrt(mean_squared_error(y_train, train_pred))),
+            'test_rmse': float(np.sqrt(mean_squared_error(y_test, test_pred))),
+            'train_r2': float(r2_score(y_train, train_pred)),
+            'test_r2': float(r2_score(y_test, test_pred)),
+            'cv_score': float(np.mean(cv_scores)),
+            'mean_rent': float(y.mean()),
+            'median_rent': float(y.median())
         }
         
         self.training_date = datetime.now().isoformat()
+        self._init_fast_path()
+        
+        # Sorted once here; get_feature_importance serves this view
+        self._sorted_importance = dict(sorted(
+            zip(self.feature_names, self.model.feature_importances_.tolist()),
+            key=lambda x: x[1],
+            reverse=True
+        ))
         
         logger.info(f"Model trained. Test R²: {self.performance_metrics['test_r2']:.3f}")
         logger.info(f"Test MAE: ${self.performance_metrics['test_mae']:.0f}/month")
@@ -229,12 +292,13 @@ class RentPredictor:
         if self.model is None:
             raise ValueError("Model not trained. Call train() first.")
         
-        # Prepare features
-        X = self.prepare_features(df)
-        X_scaled = self.scaler.transform(X)
+        X = self._feature_matrix(self.prepare_features(df))
         
-        # Make predictions
-        predictions = self.model.predict(X_scaled)
+        # Make predictions straight from the array, skipping a per-call DMatrix
+        predictions = self.model.get_booster().inplace_predict(
+            X,
+            iteration_range=(0, self.model.best_iteration + 1)
+        )
         
         results = {
             'predictions': predictions.tolist(),
@@ -256,47 +320,119 @@ class RentPredictor:
         
         return results
     
+    def _feature_matrix(self, X: pd.DataFrame) -> np.ndarray:
+        """Contiguous float32 matrix of prepared features; categorical columns go in as
+        their codes, which the booster treats as categories"""
+        categorical_columns = X.select_dtypes('category').columns
+        X = X.assign(**{col: X[col].cat.codes for col in categorical_columns})
+        return np.ascontiguousarray(X.to_numpy(dtype=np.float32))
+    
+    def _record_features(self, record: Dict) -> Dict[str, float]:
+        """Scalar counterpart of prepare_features for one record"""
+        base = base_record_features(record)
+        feats = {col: base[col] for col in BASE_FEATURES}
+        feats['age'] = base['age']
+        feats['avg_unit_size'] = base['area_per_unit']
+        feats['units_per_floor'] = base['units_per_floor']
+        feats['lot_coverage'] = base['lot_coverage']
+        
+        buckets = [
+            (['is_very_new', 'is_new', 'is_modern', 'is_older'],
+             bucket_index(base['age'], [5, 15, 30])),
+            (['is_small_units', 'is_medium_units', 'is_large_units'],
+             bucket_index(base['area_per_unit'], [60, 100])),
+            (['is_duplex_triplex', 'is_small_apartment', 'is_large_apartment'],
+             base['building_size'])
+        ]
+        for names, idx in buckets:
+            for i, name in enumerate(names):
+                feats[name] = float(i == idx)
+        
+        return feats
+    
+    def _init_fast_path(self) -> None:
+        """Feature index, category codes and scratch row used by predict_one"""
+        self._feature_index = {name: i for i, name in enumerate(self.feature_names)}
+        self._category_codes = {
+            col: {level: code for code, level in enumerate(levels)}
+            for col, levels in self.category_levels.items()
+        }
+        self._scratch = np.empty(len(self.feature_names), dtype=np.float32)
+    
+    def predict_one(self, record: Dict) -> float:
+        """Predict a single property given as a dict of raw columns, without going through pandas"""
+        
+        if self.model is None:
+            raise ValueError("Model not trained. Call train() first.")
+        
+        feats = self._record_features(record)
+        for col, codes in self._category_codes.items():
+            label = record.get(col)
+            if label is None or label != label:
+                label = 'Unknown'
+            feats[f'{col}_encoded'] = codes.get(label, codes['Autre'])
+        
+        # Shared scratch row: not safe to call concurrently on one predictor
+        row = self._scratch
+        for name, i in self._feature_index.items():
+            value = feats[name]
+            row[i] = self.imputation_medians.get(name, value) if np.isnan(value) else value
+        
+        prediction = self.model.get_booster().inplace_predict(
+            row.reshape(1, -1), iteration_range=(0, self.model.best_iteration + 1)
+        )
+        return float(prediction[0])
+    
     def get_feature_importance(self) -> Dict:
         """Get feature importance from the trained model"""
         
         if self.model is None:
             raise ValueError("Model not trained.")
         
-        importance_dict = dict(zip(
-            self.feature_names,
-            self.model.feature_importances_
-        ))
-        
-        return dict(sorted(importance_dict.items(), key=lambda x: x[1], reverse=True))
+        return self._sorted_importance
     
     def save_model(self, filepath: str) -> None:
-        """Save the trained model"""
+        """Save the booster natively with a JSON sidecar of preprocessing state"""
+        
+        # UBJSON for a .ubj path, JSON for .json
+        self.model.get_booster().save_model(filepath)
         
-        model_data = {
-            'model': self.model,
-            'scaler': self.scaler,
-            'label_encoders': self.label_encoders,
+        metadata = {
+            'category_levels': self.category_levels,
+            'imputation_medians': self.imputation_medians,
             'feature_names': self.feature_names,
             'model_version': self.model_version,
             'training_date': self.training_date,
-            'performance_metrics': self.performance_metrics
+            'performance_metrics': self.performance_metrics,
+            'feature_importance': self._sorted_importance
         }
         
-        joblib.dump(model_data, filepath)
+        # Serialize before opening the file so an unserializable value cannot truncate it
+        payload = json.dumps(metadata, indent=2)
+        with open(f"{filepath}.json", 'w') as f:
+            f.write(payload)
         logger.info(f"Rent model saved to {filepath}")
     
     def load_model(self, filepath: str) -> None:
         """Load a trained model"""
         
-        model_data = joblib.load(filepath)
+        # Resolve any symlink so the sidecar is looked up next to the real model file
+        filepath = os.path.realpath(filepath)
+        
+        self.model = xgb.XGBRegressor()
+        self.model.load_model(filepath)
+        
+        with open(f"{filepath}.json") as f:
+            metadata = json.load(f)
         
-        self.model = model_data['model']
-        self.scaler = model_data['scaler']
-        self.label_encoders = model_data['label_encoders']
-        self.feature_names = model_data['feature_names']
-        self.model_version = model_data['model_version']
-        self.training_date = model_data['training_date']
-        self.performance_metrics = model_data['performance_metrics']
+        self.category_levels = metadata['category_levels']
+        self.imputation_medians = metadata['imputation_medians']
+        self.feature_names = metadata['feature_names']
+        self.model_version = metadata['model_version']
+        self.training_date = metadata['training_date']
+        self.performance_metrics = metadata['performance_metrics']
+        self._sorted_importance = metadata['feature_importance']
+        self._init_fast_path()
         
         logger.info(f"Rent model loaded from {filepath}")
 
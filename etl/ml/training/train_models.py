@@ -4,59 +4,109 @@ Trains XGBoost models for price and rent predictions
 """
 
 import pandas as pd
+import numpy as np
+import xgboost as xgb
+import duckdb
 import sqlite3
 import os
 import sys
+import argparse
+import tempfile
 from pathlib import Path
 import logging
 from datetime import datetime
 import json
 from typing import Optional
+from scipy.stats import loguniform, randint, uniform
+from sklearn.model_selection import ParameterSampler
 
 # Add the project root to Python path
 project_root = Path(__file__).parent.parent.parent
 sys.path.append(str(project_root))
 
-from ml.models.price_predictor import PricePredictor
+from ml.models.price_predictor import PricePredictor, XGB_THREADS
 from ml.models.rent_predictor import RentPredictor
 
+# Locations searched for the database, in order
+POSSIBLE_DB_PATHS = (
+    project_root / "api" / "database.sqlite",
+    project_root / "etl" / "database.sqlite",
+    project_root / "database.sqlite"
+)
+
+# Database path found by the first successful find_database() call
+_DB_PATH_CACHE = None
+
+
+def find_database() -> str:
+    """Locate database.sqlite, probing the filesystem only until a path is found"""
+    global _DB_PATH_CACHE
+    
+    if _DB_PATH_CACHE is None:
+        # Try to find database in different locations, most likely first
+        path = next((p for p in POSSIBLE_DB_PATHS if p.exists()), None)
+        if path is None:
+            raise FileNotFoundError("Could not find database.sqlite")
+        _DB_PATH_CACHE = str(path)
+    
+    return _DB_PATH_CACHE
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class ModelTrainer:
     """Handles training and saving of ML models"""
-    def __init__(self, database_path: Optional[str] = None):
+    def __init__(self, database_path: Optional[str] = None, tune_trials: int = 0):
         if database_path is None:
-            # Try to find database in different locations
-            possible_paths = [
-                project_root / "api" / "database.sqlite",
-                project_root / "etl" / "database.sqlite",
-                project_root / "database.sqlite"
-            ]
-            
-            for path in possible_paths:
-                if path.exists():
-                    self.database_path = str(path)
-                    break
-            else:
-                raise FileNotFoundError("Could not find database.sqlite")
+            self.database_path = find_database()
         else:
             self.database_path = database_path
             
+        # Random-search trials run before each final fit; 0 keeps the predictor defaults
+        self.tune_trials = tune_trials
+        
         self.models_dir = project_root / "etl" / "data" / "models"
         self.models_dir.mkdir(parents=True, exist_ok=True)
         
         logger.info(f"Using database: {self.database_path}")
         logger.info(f"Models will be saved to: {self.models_dir}")
     
+    def _write_latest_pointer(self, model_name: str, model_path: Path):
+        """Atomically point {model_name}_latest.json at the given model artifact"""
+        latest_path = self.models_dir / f"{model_name}_latest.json"
+        with tempfile.NamedTemporaryFile('w', dir=self.models_dir, suffix='.tmp', delete=False) as tmp:
+            json.dump({'path': model_path.name}, tmp)
+        os.replace(tmp.name, latest_path)
+    
+    def _resolve_latest(self, model_name: str) -> Optional[Path]:
+        """Model artifact named by {model_name}_latest.json, or None if there is none"""
+        latest_path = self.models_dir / f"{model_name}_latest.json"
+        if not latest_path.exists():
+            return None
+        with open(latest_path) as f:
+            model_path = self.models_dir / json.load(f)['path']
+        return model_path if model_path.exists() else None
+    
+    def _query_with_duckdb(self, query: str) -> pd.DataFrame:
+        """Run a query against the SQLite database through DuckDB's sqlite scanner,
+        which builds the frame column-wise instead of from Python row tuples"""
+        con = duckdb.connect()
+        try:
+            con.execute("INSTALL sqlite")
+            con.execute("LOAD sqlite")
+            # ATTACH takes no bound parameters; quote the path as a SQL string literal
+            escaped_path = self.database_path.replace("'", "''")
+            con.execute(f"ATTACH '{escaped_path}' AS sdb (TYPE sqlite, READ_ONLY)")
+            return con.execute(query).df()
+        finally:
+            con.close()
+    
     def load_data(self) -> pd.DataFrame:
         """Load data from SQLite database"""
         
         logger.info("Loading data from database...")
         
-        conn = sqlite3.connect(self.database_path)
-        
         # Load evaluation units data
         query = """
         SELECT 
@@ -70,35 +120,90 @@ class ModelTrainer:
             superficie_terrain,
             superficie_batiment,
             etages
-        FROM evaluation_units
-        WHERE nb_logements > 0 
-        AND annee_construction > 1900 
-        AND superficie_terrain > 0
-        AND superficie_batiment > 0
-        AND etages > 0
+        FROM {table}
+        WHERE superficie_terrain BETWEEN 50 AND 2000
+        AND superficie_batiment BETWEEN 30 AND 1500
+        AND nb_logements BETWEEN 1 AND 50
+        AND annee_construction BETWEEN 1950 AND 2025
+        AND etages BETWEEN 1 AND 10
         """
         
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        
+        try:
+            df = self._query_with_duckdb(query.format(table='sdb.evaluation_units'))
+        except duckdb.Error as e:
+            # The sqlite extension may be missing and not downloadable (offline runs)
+            logger.warning(f"DuckDB SQLite scan unavailable ({e}), reading with sqlite3")
+            conn = sqlite3.connect(self.database_path)
+            try:
+                df = pd.read_sql_query(query.format(table='evaluation_units'), conn)
+            finally:
+                conn.close()
+        
+        # Outlier ranges are applied in the WHERE clause; they also exclude NULLs, and their
+        # bounds let the columns be stored in the narrowest types
+        df = df.astype({
+            'nb_logements': 'uint8',
+            'etages': 'uint8',
+            'annee_construction': 'uint16',
+            'superficie_terrain': 'float32',
+            'superficie_batiment': 'float32'
+        })
         logger.info(f"Loaded {len(df)} records from database")
         
-        # Basic data cleaning
-        df = df.dropna(subset=['nb_logements', 'annee_construction', 'superficie_terrain', 'superficie_batiment'])
-        
-        # Remove outliers
-        df = df[
-            (df['superficie_terrain'] >= 50) & (df['superficie_terrain'] <= 2000) &
-            (df['superficie_batiment'] >= 30) & (df['superficie_batiment'] <= 1500) &
-            (df['nb_logements'] >= 1) & (df['nb_logements'] <= 50) &
-            (df['annee_construction'] >= 1950) & (df['annee_construction'] <= 2025) &
-            (df['etages'] >= 1) & (df['etages'] <= 10)
-        ]
-        
-        logger.info(f"After cleaning: {len(df)} records")
-        
         return df
     
+    def _tune(self, predictor_cls, df: pd.DataFrame) -> dict:
+        """Random search over the XGBoost hyperparameters, scored by 3-fold CV RMSE"""
+        
+        logger.info(f"Tuning {predictor_cls.__name__} over {self.tune_trials} trials...")
+        
+        # A throwaway predictor, so the one being trained keeps its own target noise stream
+        probe = predictor_cls()
+        X = probe.prepare_features(df)
+        feature_types = ['c' if X[col].dtype == 'category' else 'q' for col in X.columns]
+        dtrain = xgb.DMatrix(
+            probe._feature_matrix(X),
+            label=probe.create_target_variable(df).to_numpy(dtype=np.float32),
+            feature_types=feature_types,
+            enable_categorical=True
+        )
+        
+        search_space = {
+            'max_depth': randint(3, 11),
+            'learning_rate': loguniform(0.01, 0.3),
+            'subsample': uniform(0.6, 0.4),
+            'colsample_bytree': uniform(0.6, 0.4),
+            'reg_alpha': loguniform(1e-3, 10),
+            'reg_lambda': loguniform(1e-3, 10),
+            'gamma': uniform(0, 5)
+        }
+        base_params = {
+            'objective': 'reg:squarederror',
+            'tree_method': 'hist',
+            'max_bin': 256,
+            'nthread': XGB_THREADS,
+            'seed': 42
+        }
+        
+        best_rmse, best_params = np.inf, None
+        for trial in ParameterSampler(search_space, n_iter=self.tune_trials, random_state=42):
+            history = xgb.cv(
+                {**base_params, **trial},
+                dtrain,
+                num_boost_round=500,
+                nfold=3,
+                early_stopping_rounds=20,
+                seed=42
+            )
+            rmse = history['test-rmse-mean'].iloc[-1]
+            if rmse < best_rmse:
+                best_rmse = rmse
+                best_params = {**trial, 'n_estimators': len(history)}
+        
+        best_params = {k: v.item() if isinstance(v, np.generic) else v for k, v in best_params.items()}
+        logger.info(f"Best CV RMSE {best_rmse:.2f} with {best_params}")
+        return best_params
+    
     def train_price_model(self, df: pd.DataFrame) -> dict:
         """Train the price prediction model"""
         
@@ -107,18 +212,16 @@ class ModelTrainer:
         model_version = f"v1.0.{datetime.now().strftime('%Y%m%d')}"
         predictor = PricePredictor(model_version=model_version)
         
-        # Train model
-        metrics = predictor.train(df, test_size=0.2)
+        # Train model, optionally with tuned hyperparameters
+        params = self._tune(PricePredictor, df) if self.tune_trials > 0 else None
+        metrics = predictor.train(df, test_size=0.2, params=params)
         
         # Save model
-        model_path = self.models_dir / f"price_predictor_{model_version}.joblib"
+        model_path = self.models_dir / f"price_predictor_{model_version}.ubj"
         predictor.save_model(str(model_path))
         
-        # Save latest version link
-        latest_path = self.models_dir / "price_predictor_latest.joblib"
-        if latest_path.exists():
-            latest_path.unlink()
-        latest_path.symlink_to(model_path.name)
+        # Point the latest version at the new artifact
+        self._write_latest_pointer("price_predictor", model_path)
         
         # Get feature importance
         feature_importance = predictor.get_feature_importance()
@@ -131,6 +234,7 @@ class ModelTrainer:
             'data_size': len(df),
             'metrics': metrics,
             'feature_importance': feature_importance,
+            'tuned_params': params,
             'model_path': str(model_path)
         }
         
@@ -150,18 +254,16 @@ class ModelTrainer:
         model_version = f"v1.0.{datetime.now().strftime('%Y%m%d')}"
         predictor = RentPredictor(model_version=model_version)
         
-        # Train model
-        metrics = predictor.train(df, test_size=0.2)
+        # Train model, optionally with tuned hyperparameters
+        params = self._tune(RentPredictor, df) if self.tune_trials > 0 else None
+        metrics = predictor.train(df, test_size=0.2, params=params)
         
         # Save model
-        model_path = self.models_dir / f"rent_predictor_{model_version}.joblib"
+        model_path = self.models_dir / f"rent_predictor_{model_version}.ubj"
         predictor.save_model(str(model_path))
         
-        # Save latest version link
-        latest_path = self.models_dir / "rent_predictor_latest.joblib"
-        if latest_path.exists():
-            latest_path.unlink()
-        latest_path.symlink_to(model_path.name)
+        # Point the latest version at the new artifact
+        self._write_latest_pointer("rent_predictor", model_path)
         
         # Get feature importance
         feature_importance = predictor.get_feature_importance()
@@ -174,6 +276,7 @@ class ModelTrainer:
             'data_size': len(df),
             'metrics': metrics,
             'feature_importance': feature_importance,
+            'tuned_params': params,
             'model_path': str(model_path)
         }
         
@@ -194,55 +297,59 @@ class ModelTrainer:
         price_model = PricePredictor()
         rent_model = RentPredictor()
         
-        price_model_path = self.models_dir / "price_predictor_latest.joblib"
-        rent_model_path = self.models_dir / "rent_predictor_latest.joblib"
+        price_model_path = self._resolve_latest("price_predictor")
+        rent_model_path = self._resolve_latest("rent_predictor")
         
-        if not price_model_path.exists() or not rent_model_path.exists():
+        if price_model_path is None or rent_model_path is None:
             raise FileNotFoundError("Trained models not found. Run training first.")
         
         price_model.load_model(str(price_model_path))
         rent_model.load_model(str(rent_model_path))
         
-        # Group by street to create zone-level predictions
-        zone_predictions = []
-        
-        for street, group in df.groupby('nom_rue'):
-            if len(group) < 3:  # Skip streets with very few properties
-                continue
-            
-            # Calculate representative values for the zone
-            zone_data = pd.DataFrame({
-                'superficie_terrain': [group['superficie_terrain'].median()],
-                'superficie_batiment': [group['superficie_batiment'].median()],
-                'nb_logements': [group['nb_logements'].median()],
-                'annee_construction': [group['annee_construction'].median()],
-                'etages': [group['etages'].median()],
-                'libelle_utilisation': [group['libelle_utilisation'].mode().iloc[0]]
-            })
-            
-            # Make predictions
-            price_pred = price_model.predict(zone_data)
-            rent_pred = rent_model.predict(zone_data)
-            
-            zone_predictions.append({
-                'zone_id': street,
-                'street_name': street,
-                'property_count': len(group),
-                'total_units': group['nb_logements'].sum(),
-                'price_per_m2_prediction': price_pred['predictions'][0],
-                'price_confidence_lower': price_pred['confidence_lower'][0],
-                'price_confidence_upper': price_pred['confidence_upper'][0],
-                'rent_prediction': rent_pred['predictions'][0],
-                'rent_confidence_lower': rent_pred['confidence_lower'][0],
-                'rent_confidence_upper': rent_pred['confidence_upper'][0],
-                'model_version': f"{price_model.model_version}_{rent_model.model_version}",
-                'quarter': f"{datetime.now().year}Q{((datetime.now().month-1)//3)+1}"
-            })
-        
-        predictions_df = pd.DataFrame(zone_predictions)
+        # Skip streets with very few properties
+        street_sizes = df['nom_rue'].value_counts()
+        df = df[df['nom_rue'].isin(street_sizes.index[street_sizes.to_numpy() >= 3])]
+        
+        # Representative values for every street in one grouped pass
+        zones = df.groupby('nom_rue').agg(
+            superficie_terrain=('superficie_terrain', 'median'),
+            superficie_batiment=('superficie_batiment', 'median'),
+            nb_logements=('nb_logements', 'median'),
+            annee_construction=('annee_construction', 'median'),
+            etages=('etages', 'median'),
+            libelle_utilisation=('libelle_utilisation', lambda s: s.mode().iloc[0]),
+            property_count=('nom_rue', 'size'),
+            total_units=('nb_logements', 'sum')
+        )
+        
+        now = datetime.now()
+        quarter = f"{now.year}Q{((now.month-1)//3)+1}"
+        
+        # One batched prediction per model for all zones
+        price_pred = price_model.predict(zones)
+        rent_pred = rent_model.predict(zones)
+        
+        predictions_df = pd.DataFrame({
+            'zone_id': zones.index,
+            'street_name': zones.index,
+            'property_count': zones['property_count'].to_numpy(),
+            'total_units': zones['total_units'].to_numpy(),
+            'price_per_m2_prediction': price_pred['predictions'],
+            'price_confidence_lower': price_pred['confidence_lower'],
+            'price_confidence_upper': price_pred['confidence_upper'],
+            'rent_prediction': rent_pred['predictions'],
+            'rent_confidence_lower': rent_pred['confidence_lower'],
+            'rent_confidence_upper': rent_pred['confidence_upper'],
+            'model_version': f"{price_model.model_version}_{rent_model.model_version}",
+            'quarter': quarter
+        })
         
         # Save predictions to database
         conn = sqlite3.connect(self.database_path)
+        # The table is rebuilt from scratch on each run, so skip fsyncs for this connection;
+        # to_sql already inserts through one executemany inside a single transaction
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("PRAGMA temp_store=MEMORY")
         predictions_df.to_sql('predictions', conn, if_exists='replace', index=False)
         conn.close()
         
@@ -300,9 +407,13 @@ class ModelTrainer:
 
 def main():
     """Main training function"""
+    parser = argparse.ArgumentParser(description="Train the price and rent prediction models")
+    parser.add_argument('--tune-trials', type=int, default=0,
+                        help="Hyperparameter search trials per model (0 keeps the default parameters)")
+    args = parser.parse_args()
     
     try:
-        trainer = ModelTrainer()
+        trainer = ModelTrainer(tune_trials=args.tune_trials)
         summary = trainer.train_all_models()
         
         if summary is not None:
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+In-process CMHC ingestion -> forecasting pipeline.
+Hands DataFrames from ingestion straight to forecasting instead of
+round-tripping them through parquet on disk.
+"""
+
+import logging
+
+from frame_cache import FRAME_CACHE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def run_pipeline(persist_raw: bool = False) -> dict:
+    """
+    Run CMHC ingestion and forecasting in a single process.
+    With persist_raw, the raw parquet files are still written for external
+    consumers; forecasting reads the cached frames either way.
+    """
+    import forecast
+    import ingest_cmhc
+
+    logger.info("Starting in-process CMHC pipeline")
+
+    if persist_raw:
+        ingest_cmhc.main()
+    else:
+        FRAME_CACHE["rental"] = ingest_cmhc.create_sample_rental_data()
+        FRAME_CACHE["housing_starts"] = ingest_cmhc.create_sample_housing_starts()
+
+    forecast.setup_directories()
+    all_forecasts = forecast.generate_forecasts(forecast.load_processed_data())
+    if not all_forecasts:
+        raise RuntimeError("In-process pipeline generated no forecasts")
+    forecast.save_forecasts(all_forecasts)
+
+    logger.info(f"In-process pipeline completed - generated {len(all_forecasts)} forecasts")
+    return all_forecasts
+
+if __name__ == "__main__":
+    run_pipeline()
@@ -8,12 +8,18 @@ pour InvestMTL en les transformant en format exploitable.
 
 import os
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 import logging
 from pathlib import Path
 import json
 import numpy as np
 from datetime import datetime
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 # Configuration des logs
 logging.basicConfig(
@@ -28,6 +34,97 @@ RAW_DATA_DIR = BASE_DIR / "data" / "raw" / "real_estate"
 PROCESSED_DATA_DIR = BASE_DIR / "data" / "processed"
 PROCESSED_DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+# Colonnes numériques des unités d'évaluation et leur type final; lues en texte puis
+# converties après coup, une cellule invalide devient nulle au lieu d'interrompre la lecture
+MONTREAL_UNIT_NUMERIC_TYPES = {
+    **{col: pa.int64() for col in ['ETAGE_HORS_SOL', 'NOMBRE_LOGEMENT', 'ANNEE_CONSTRUCTION']},
+    **{col: pa.float64() for col in ['SUPERFICIE_TERRAIN', 'SUPERFICIE_BATIMENT']}
+}
+
+# Types des colonnes des unités d'évaluation appliqués à la lecture du CSV
+MONTREAL_UNIT_COLUMN_TYPES = {
+    **{col: pa.string() for col in ['ID_UEV', 'CIVIQUE_DEBUT', 'CIVIQUE_FIN', 'NOM_RUE', 'SUITE_DEBUT',
+                                    'MUNICIPALITE', 'CODE_UTILISATION', 'LIBELLE_UTILISATION',
+                                    'CATEGORIE_UEF', 'MATRICULE83', 'NO_ARROND_ILE_CUM']},
+    **{col: pa.string() for col in MONTREAL_UNIT_NUMERIC_TYPES}
+}
+
+# Nombre de lignes conservées des rôles d'évaluation du Québec
+QUEBEC_SAMPLE_SIZE = 10000
+
+# Options d'écriture Parquet: ZSTD et dictionnaires pour les colonnes texte très répétitives
+# (rues, libellés), statistiques de colonnes pour filtrer à la lecture
+PARQUET_WRITE_OPTIONS = {
+    'compression': 'zstd',
+    'compression_level': 3,
+    'use_dictionary': True,
+    'data_page_size': 1 << 20,
+    'write_statistics': True
+}
+
+# Colonnes lues par l'analyse des types de propriétés
+ANALYSIS_COLUMNS = ['LIBELLE_UTILISATION', 'ANNEE_CONSTRUCTION', 'SUPERFICIE_TERRAIN', 'SUPERFICIE_BATIMENT']
+
+# Colonnes agrégées par rue pour les zones d'investissement
+STREET_AGGREGATION_COLUMNS = ['NOM_RUE', 'ID_UEV', 'NOMBRE_LOGEMENT', 'ANNEE_CONSTRUCTION',
+                              'SUPERFICIE_TERRAIN', 'SUPERFICIE_BATIMENT', 'ETAGE_HORS_SOL']
+
+# Correspondance Arrow -> pandas (chaînes 'string', entiers nullables 'Int64')
+PANDAS_TYPES = {pa.string(): pd.StringDtype(), pa.int64(): pd.Int64Dtype()}
+
+def coerce_numeric_columns(table, column_types):
+    """Convertit des colonnes texte en nombres; les valeurs invalides deviennent nulles"""
+    for col, arrow_type in column_types.items():
+        if col not in table.column_names:
+            continue
+        raw = table[col].to_pandas()
+        values = pd.to_numeric(raw, errors='coerce')
+        if pa.types.is_integer(arrow_type):
+            # Un nombre non entier est invalide pour une colonne entière
+            values = values.where(values % 1 == 0)
+        invalid = int((values.isna() & raw.notna()).sum())
+        if invalid:
+            logger.warning(f"⚠️ {col}: {invalid:,} valeurs non numériques ignorées")
+        table = table.set_column(
+            table.column_names.index(col), col, pa.array(values, type=arrow_type, from_pandas=True)
+        )
+    return table
+
+def process_statistics_canada_file(file_path, output_dir):
+    """Traite un fichier de Statistique Canada; renvoie (fichier, jeu de données, erreur)"""
+    logger.info(f"📄 Traitement: {file_path.name}")
+    
+    try:
+        # Vérifier si c'est un ZIP
+        if file_path.name.endswith(('.zip', '.ZIP')):
+            with zipfile.ZipFile(file_path, 'r') as zip_ref:
+                csv_files = [f for f in zip_ref.namelist() if f.endswith('.csv')]
+                if csv_files:
+                    for csv_file in csv_files:
+                        with zip_ref.open(csv_file) as csv_f:
+                            df = pd.read_csv(csv_f, low_memory=False)
+                            logger.info(f"📊 {csv_file}: {len(df):,} lignes, {len(df.columns)} colonnes")
+        elif file_path.is_file() and not file_path.name.endswith('.json'):
+            df = pd.read_csv(file_path, low_memory=False)
+            logger.info(f"📊 {file_path.name}: {len(df):,} lignes, {len(df.columns)} colonnes")
+            
+            # Sauvegarder en Parquet pour efficacité
+            output_name = file_path.stem + ".parquet"
+            output_path = output_dir / output_name
+            df.to_parquet(output_path, index=False, **PARQUET_WRITE_OPTIONS)
+            
+            return file_path, {
+                'records': len(df),
+                'file': str(output_path),
+                'description': f'Statistique Canada - {file_path.name}'
+            }, None
+            
+    except Exception as e:
+        logger.error(f"❌ Erreur avec {file_path.name}: {e}")
+        return file_path, None, str(e)
+    
+    return file_path, None, None
+
 class RealEstateProcessor:
     def __init__(self):
         self.datasets = {}
@@ -48,48 +145,48 @@ class RealEstateProcessor:
             return None
             
         try:
-            # Charger le fichier CSV
-            df = pd.read_csv(file_path, low_memory=False)
-            
-            # Optimiser les types après chargement
-            for col in ['ID_UEV', 'CIVIQUE_DEBUT', 'CIVIQUE_FIN', 'NOM_RUE', 'SUITE_DEBUT', 
-                       'MUNICIPALITE', 'CODE_UTILISATION', 'LIBELLE_UTILISATION', 
-                       'CATEGORIE_UEF', 'MATRICULE83', 'NO_ARROND_ILE_CUM']:
-                if col in df.columns:
-                    df[col] = df[col].astype('string')
+            # Charger le fichier CSV avec PyArrow (multithread); les colonnes numériques
+            # sont lues en texte puis converties, une cellule invalide devenant nulle
+            table = pacsv.read_csv(
+                file_path,
+                read_options=pacsv.ReadOptions(use_threads=True),
+                convert_options=pacsv.ConvertOptions(
+                    column_types=MONTREAL_UNIT_COLUMN_TYPES,
+                    strings_can_be_null=True
+                )
+            )
+            table = coerce_numeric_columns(table, MONTREAL_UNIT_NUMERIC_TYPES)
+            logger.info(f"📊 {table.num_rows:,} unités d'évaluation chargées")
+            logger.info(f"🏢 Colonnes: {table.column_names}")
             
-            for col in ['ETAGE_HORS_SOL', 'NOMBRE_LOGEMENT', 'ANNEE_CONSTRUCTION']:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
-                    
-            for col in ['SUPERFICIE_TERRAIN', 'SUPERFICIE_BATIMENT']:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
+            # Statistiques de base, calculées sur la table Arrow complète
+            is_logement = pc.match_substring(table['LIBELLE_UTILISATION'], 'Logement')
+            is_condo = pc.equal(table['CATEGORIE_UEF'], 'Condominium')
+            years = pc.min_max(table['ANNEE_CONSTRUCTION']).as_py()
+            logger.info(f"🏠 Logements résidentiels: {pc.sum(is_logement).as_py() or 0:,}")
+            logger.info(f"🏢 Condominiums: {pc.sum(is_condo).as_py() or 0:,}")
+            logger.info(f"📅 Années construction: {years['min']} - {years['max']}")
             
-            logger.info(f"📊 {len(df):,} unités d'évaluation chargées")
-            logger.info(f"🏢 Colonnes: {list(df.columns)}")
+            # Filtrer pour Montréal seulement (municipalité 50); la suite travaille sur la
+            # table Arrow et ne convertit en pandas que les colonnes dont elle a besoin
+            montreal = table.filter(pc.equal(table['MUNICIPALITE'], '50'))
+            logger.info(f"🌆 Unités dans Montréal: {montreal.num_rows:,}")
             
-            # Statistiques de base
-            logger.info(f"🏠 Logements résidentiels: {len(df[df['LIBELLE_UTILISATION'].str.contains('Logement', na=False)]):,}")
-            logger.info(f"🏢 Condominiums: {len(df[df['CATEGORIE_UEF'] == 'Condominium']):,}")
-            logger.info(f"📅 Années construction: {df['ANNEE_CONSTRUCTION'].min()} - {df['ANNEE_CONSTRUCTION'].max()}")
-            
-            # Filtrer pour Montréal seulement (municipalité 50)
-            df_montreal = df[df['MUNICIPALITE'] == '50'].copy()
-            logger.info(f"🌆 Unités dans Montréal: {len(df_montreal):,}")
-            
-            # Sauvegarder
+            # Sauvegarder directement depuis Arrow; les métadonnées pandas (tirées d'une
+            # conversion à vide) conservent les types à la relecture
             output_path = PROCESSED_DATA_DIR / "montreal_evaluation_units.parquet"
-            df_montreal.to_parquet(output_path, index=False)
+            empty_frame = montreal.slice(0, 0).to_pandas(types_mapper=PANDAS_TYPES.get)
+            pandas_metadata = pa.Schema.from_pandas(empty_frame, preserve_index=False).metadata
+            pq.write_table(montreal.replace_schema_metadata(pandas_metadata), output_path, **PARQUET_WRITE_OPTIONS)
             logger.info(f"💾 Sauvegardé: {output_path}")
             
             self.datasets['montreal_units'] = {
-                'records': len(df_montreal),
+                'records': montreal.num_rows,
                 'file': str(output_path),
                 'description': 'Unités d\'évaluation foncière de Montréal'
             }
             
-            return df_montreal
+            return montreal
             
         except Exception as e:
             logger.error(f"❌ Erreur lors du traitement: {e}")
@@ -106,27 +203,41 @@ class RealEstateProcessor:
             return None
             
         try:
-            # Le fichier semble avoir un format spécial avec des types de colonnes
-            df = pd.read_csv(file_path, low_memory=False)
+            # Le fichier semble avoir un format spécial avec des types de colonnes.
+            # Lecture en flux: on s'arrête dès que l'échantillon est complet au lieu
+            # d'analyser tout le fichier (plusieurs Go)
+            reader = pacsv.open_csv(
+                file_path,
+                read_options=pacsv.ReadOptions(block_size=8 << 20, use_threads=True),
+                convert_options=pacsv.ConvertOptions(strings_can_be_null=True)
+            )
+            batches, loaded = [], 0
+            for batch in reader:
+                batches.append(batch)
+                loaded += batch.num_rows
+                if loaded >= QUEBEC_SAMPLE_SIZE:
+                    break
+            reader.close()
+            table = pa.Table.from_batches(batches, schema=reader.schema)
             
-            logger.info(f"📊 {len(df):,} rôles d'évaluation chargés")
-            logger.info(f"🏢 Colonnes: {list(df.columns)}")
+            logger.info(f"📊 {table.num_rows:,} rôles d'évaluation chargés")
+            logger.info(f"🏢 Colonnes: {table.column_names}")
             
             # Nettoyer les noms de colonnes (enlever les types)
-            df.columns = [col.split(',')[0] for col in df.columns]
+            table = table.rename_columns([col.split(',')[0] for col in table.column_names])
             
             # Sauvegarder un échantillon pour analyse
-            sample_size = min(10000, len(df))
-            df_sample = df.head(sample_size).copy()
+            sample_size = min(QUEBEC_SAMPLE_SIZE, table.num_rows)
+            df_sample = table.slice(0, sample_size).to_pandas()
             
             output_path = PROCESSED_DATA_DIR / "quebec_evaluation_sample.parquet"
-            df_sample.to_parquet(output_path, index=False)
+            df_sample.to_parquet(output_path, index=False, **PARQUET_WRITE_OPTIONS)
             logger.info(f"💾 Échantillon sauvegardé: {output_path} ({sample_size:,} lignes)")
             
             self.datasets['quebec_sample'] = {
                 'records': sample_size,
                 'file': str(output_path),
-                'description': f'Échantillon rôles d\'évaluation Québec ({sample_size:,} sur {len(df):,})'
+                'description': f'Échantillon rôles d\'évaluation Québec ({sample_size:,} premières lignes)'
             }
             
             return df_sample
@@ -141,46 +252,34 @@ class RealEstateProcessor:
         logger.info("📈 Traitement des données de Statistique Canada")
         
         stats_can_files = [f for f in RAW_DATA_DIR.glob("statistics_canada_*")]
+        if not stats_can_files:
+            return
         
-        for file_path in stats_can_files:
-            logger.info(f"📄 Traitement: {file_path.name}")
-            
-            try:
-                # Vérifier si c'est un ZIP
-                if file_path.name.endswith(('.zip', '.ZIP')):
-                    with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                        csv_files = [f for f in zip_ref.namelist() if f.endswith('.csv')]
-                        if csv_files:
-                            for csv_file in csv_files:
-                                with zip_ref.open(csv_file) as csv_f:
-                                    df = pd.read_csv(csv_f, low_memory=False)
-                                    logger.info(f"📊 {csv_file}: {len(df):,} lignes, {len(df.columns)} colonnes")
-                elif file_path.is_file() and not file_path.name.endswith('.json'):
-                    df = pd.read_csv(file_path, low_memory=False)
-                    logger.info(f"📊 {file_path.name}: {len(df):,} lignes, {len(df.columns)} colonnes")
-                    
-                    # Sauvegarder en Parquet pour efficacité
-                    output_name = file_path.stem + ".parquet"
-                    output_path = PROCESSED_DATA_DIR / output_name
-                    df.to_parquet(output_path, index=False)
-                    
-                    self.datasets[file_path.stem] = {
-                        'records': len(df),
-                        'file': str(output_path),
-                        'description': f'Statistique Canada - {file_path.name}'
-                    }
-                    
-            except Exception as e:
-                logger.error(f"❌ Erreur avec {file_path.name}: {e}")
-                self.summary['processing_errors'].append(f"{file_path.name}: {str(e)}")
+        # Fichiers indépendants: un processus par fichier, plafonné car pandas/PyArrow
+        # utilisent déjà leurs propres threads dans chaque processus
+        max_workers = min(len(stats_can_files), max(1, (os.cpu_count() or 4) // 4))
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(
+                process_statistics_canada_file,
+                stats_can_files,
+                repeat(PROCESSED_DATA_DIR)
+            ))
+        
+        for file_path, dataset, error in results:
+            if error is not None:
+                self.summary['processing_errors'].append(f"{file_path.name}: {error}")
+            elif dataset is not None:
+                self.datasets[file_path.stem] = dataset
 
-    def analyze_property_types_and_values(self, df_montreal):
+    def analyze_property_types_and_values(self, montreal):
         """Analyse les types de propriétés et leurs valeurs"""
-        if df_montreal is None or len(df_montreal) == 0:
+        if montreal is None or montreal.num_rows == 0:
             return
             
         logger.info("🏠 Analyse des types de propriétés")
         
+        df_montreal = montreal.select(ANALYSIS_COLUMNS).to_pandas(types_mapper=PANDAS_TYPES.get)
+        
         # Analyse par type d'utilisation
         usage_stats = df_montreal['LIBELLE_UTILISATION'].value_counts().head(10)
         logger.info("🏢 Top 10 des types d'utilisation:")
@@ -205,7 +304,7 @@ class RealEstateProcessor:
         
         # Créer un résumé analytique
         analysis = {
-            'total_units': len(df_montreal),
+            'total_units': montreal.num_rows,
             'property_types': usage_stats.to_dict(),
             'construction_period': {
                 'min_year': int(construction_years.min()) if len(construction_years) > 0 else None,
@@ -225,37 +324,50 @@ class RealEstateProcessor:
         
         logger.info(f"📊 Analyse sauvegardée: {analysis_path}")
 
-    def generate_investment_zones(self, df_montreal):
+    def select_residential(self, montreal):
+        """Sous-ensemble des logements résidentiels, limité aux colonnes agrégées par rue"""
+        # Le test de sous-chaîne porte sur les quelques dizaines de libellés distincts;
+        # un libellé manquant donne un masque nul, que le filtre écarte
+        usage = pc.dictionary_encode(montreal['LIBELLE_UTILISATION']).combine_chunks()
+        is_logement = pc.take(pc.match_substring(usage.dictionary, 'Logement'), usage.indices)
+        return montreal.filter(is_logement).select(STREET_AGGREGATION_COLUMNS)
+
+    def generate_investment_zones(self, montreal, residential=None):
         """Génère des zones d'investissement basées sur les données"""
-        if df_montreal is None or len(df_montreal) == 0:
+        if montreal is None or montreal.num_rows == 0:
             return
             
         logger.info("🎯 Génération des zones d'investissement")
         
-        # Logements résidentiels uniquement
-        residential = df_montreal[
-            df_montreal['LIBELLE_UTILISATION'].str.contains('Logement', na=False)
-        ].copy()
+        # Logements résidentiels uniquement (réutilise le sous-ensemble fourni par process_all)
+        if residential is None:
+            residential = self.select_residential(montreal)
         
-        if len(residential) == 0:
+        if residential.num_rows == 0:
             logger.warning("⚠️ Aucun logement résidentiel trouvé")
             return
         
-        logger.info(f"🏠 {len(residential):,} logements résidentiels analysés")
-        
-        # Grouper par rue pour créer des zones
-        street_analysis = residential.groupby('NOM_RUE').agg({
-            'ID_UEV': 'count',
-            'NOMBRE_LOGEMENT': 'sum',
-            'ANNEE_CONSTRUCTION': ['mean', 'min', 'max'],
-            'SUPERFICIE_TERRAIN': 'mean',
-            'SUPERFICIE_BATIMENT': 'mean',
-            'ETAGE_HORS_SOL': 'mean'
-        }).reset_index()
-        
-        # Aplatir les colonnes multi-niveau
-        street_analysis.columns = ['_'.join(col).strip('_') for col in street_analysis.columns]
-        street_analysis.rename(columns={'NOM_RUE_': 'street_name'}, inplace=True)
+        logger.info(f"🏠 {residential.num_rows:,} logements résidentiels analysés")
+        
+        # Grouper par rue pour créer des zones, agrégation multithread de PyArrow
+        # (groupes non triés: le classement final se fait sur le score)
+        streets = residential.filter(pc.is_valid(residential['NOM_RUE']))
+        keep_empty = pc.ScalarAggregateOptions(min_count=0)  # somme vide = 0, comme pandas
+        street_analysis = streets.group_by('NOM_RUE').aggregate([
+            ('ID_UEV', 'count'),
+            ('NOMBRE_LOGEMENT', 'sum', keep_empty),
+            ('ANNEE_CONSTRUCTION', 'mean'),
+            ('ANNEE_CONSTRUCTION', 'min'),
+            ('ANNEE_CONSTRUCTION', 'max'),
+            ('SUPERFICIE_TERRAIN', 'mean'),
+            ('SUPERFICIE_BATIMENT', 'mean'),
+            ('ETAGE_HORS_SOL', 'mean')
+        ])
+        
+        # Colonnes déjà nommées <colonne>_<agrégat>; rue en premier
+        street_analysis = street_analysis.select(
+            ['NOM_RUE'] + [name for name in street_analysis.column_names if name != 'NOM_RUE']
+        ).to_pandas(types_mapper=PANDAS_TYPES.get)
         
         # Vérifier les colonnes créées
         logger.info(f"📋 Colonnes créées: {list(street_analysis.columns)}")
@@ -263,32 +375,51 @@ class RealEstateProcessor:
         # Filtrer les rues avec au moins 5 propriétés
         significant_streets = street_analysis[street_analysis['ID_UEV_count'] >= 5].copy()
         
-        # Calculer un score d'attractivité
-        significant_streets['density_score'] = significant_streets['NOMBRE_LOGEMENT_sum'] / significant_streets['ID_UEV_count']
-        significant_streets['modernity_score'] = (significant_streets['ANNEE_CONSTRUCTION_mean'] - 1950) / (2024 - 1950) * 100
-        significant_streets['size_score'] = significant_streets['SUPERFICIE_BATIMENT_mean'] / 100
+        # Calculer un score d'attractivité, sur des tableaux NumPy en place
+        # (valeurs manquantes en NaN, ignorées par les maxima comme avec pandas)
+        def column(name):
+            return significant_streets[name].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
         
-        # Score composite (normalisé sur 100)
-        max_density = significant_streets['density_score'].max()
-        max_size = significant_streets['size_score'].max()
+        density = column('NOMBRE_LOGEMENT_sum')
+        density /= column('ID_UEV_count')
+        modernity = column('ANNEE_CONSTRUCTION_mean')
+        modernity -= 1950
+        modernity /= (2024 - 1950)
+        modernity *= 100
+        size = column('SUPERFICIE_BATIMENT_mean')
+        size /= 100
         
-        significant_streets['investment_score'] = (
-            (significant_streets['density_score'] / max_density * 30) +
-            (significant_streets['modernity_score'] * 0.4) +
-            (significant_streets['size_score'] / max_size * 30)
-        ).round(1)
+        # Score composite (normalisé sur 100)
+        max_density = np.fmax.reduce(density, initial=np.nan)
+        max_size = np.fmax.reduce(size, initial=np.nan)
+        
+        score = density / max_density
+        score *= 30
+        score += modernity * 0.4
+        weighted_size = size / max_size
+        weighted_size *= 30
+        score += weighted_size
+        np.round(score, 1, out=score)
+        
+        significant_streets['density_score'] = density
+        significant_streets['modernity_score'] = modernity
+        significant_streets['size_score'] = size
+        significant_streets['investment_score'] = score
         
         # Trier par score d'investissement
-        top_zones = significant_streets.sort_values('investment_score', ascending=False).head(50)
+        # (ex aequo départagés par nom de rue, indépendamment de l'ordre des groupes)
+        top_zones = significant_streets.sort_values(
+            ['investment_score', 'NOM_RUE'], ascending=[False, True]
+        ).head(50)
         
         logger.info(f"🎯 Top 10 des zones d'investissement:")
-        for _, zone in top_zones.head(10).iterrows():
-            street_col = 'street_name' if 'street_name' in zone.index else zone.index[0]
-            logger.info(f"   {zone[street_col]}: Score {zone['investment_score']}/100 ({zone['ID_UEV_count']} propriétés)")
+        top_ten = top_zones.head(10)[['NOM_RUE', 'investment_score', 'ID_UEV_count']]
+        for street, score, count in top_ten.itertuples(index=False, name=None):
+            logger.info(f"   {street}: Score {score}/100 ({count} propriétés)")
         
         # Sauvegarder les zones d'investissement
         zones_path = PROCESSED_DATA_DIR / "investment_zones.parquet"
-        top_zones.to_parquet(zones_path, index=False)
+        top_zones.to_parquet(zones_path, index=False, **PARQUET_WRITE_OPTIONS)
         logger.info(f"🎯 Zones d'investissement sauvegardées: {zones_path}")
         
         self.datasets['investment_zones'] = {
@@ -301,17 +432,18 @@ class RealEstateProcessor:
         """Traite tous les datasets"""
         logger.info("🚀 Début du traitement des données immobilières")
         
-        # 1. Charger les unités d'évaluation de Montréal
-        df_montreal = self.load_montreal_evaluation_units()
-        if df_montreal is not None:
+        # 1. Charger les unités d'évaluation de Montréal (table Arrow)
+        montreal = self.load_montreal_evaluation_units()
+        if montreal is not None:
             self.summary['files_processed'] += 1
-            self.summary['total_records'] += len(df_montreal)
+            self.summary['total_records'] += montreal.num_rows
         
         # 2. Analyser les propriétés et valeurs
-        self.analyze_property_types_and_values(df_montreal)
+        self.analyze_property_types_and_values(montreal)
         
         # 3. Générer les zones d'investissement
-        self.generate_investment_zones(df_montreal)
+        residential = self.select_residential(montreal) if montreal is not None else None
+        self.generate_investment_zones(montreal, residential)
         
         # 4. Charger un échantillon des rôles du Québec
         df_quebec = self.load_quebec_evaluation_rolls()
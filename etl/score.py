@@ -54,31 +54,25 @@ def load_features_and_forecasts() -> tuple:
 def calculate_growth_score(features_df: pd.DataFrame) -> pd.Series:
     """Calculate growth potential score (0-100)."""
     try:
-        scores = pd.Series(index=features_df.index, dtype=float)
-        
-        # Population density as growth proxy
-        if "population" in features_df.columns:
-            pop_scores = MinMaxScaler().fit_transform(
-                features_df[["population"]].fillna(0)
-            ).flatten() * 100
-            scores = scores.fillna(0) + pop_scores * 0.4
-        
-        # Income growth potential
-        if "income_median" in features_df.columns:
-            income_scores = MinMaxScaler().fit_transform(
-                features_df[["income_median"]].fillna(0)
-            ).flatten() * 100
-            scores = scores.fillna(0) + income_scores * 0.3
-        
-        # Construction activity
-        if "recent_construction_value" in features_df.columns:
-            construction_scores = MinMaxScaler().fit_transform(
-                features_df[["recent_construction_value"]].fillna(0)
-            ).flatten() * 100
-            scores = scores.fillna(0) + construction_scores * 0.3
+        # Population density as growth proxy, income growth potential, construction activity
+        weights = {"population": 0.4, "income_median": 0.3, "recent_construction_value": 0.3}
+        columns = [col for col in weights if col in features_df.columns]
+        
+        if columns:
+            # Min-max scale all available columns to 0-100 in one array (constant column -> 0)
+            values = features_df[columns].fillna(0).to_numpy(dtype=float)
+            col_min = values.min(axis=0)
+            col_range = values.max(axis=0) - col_min
+            col_range[col_range == 0] = 1
+            np.subtract(values, col_min, out=values)
+            np.divide(values, col_range, out=values)
+            np.multiply(values, 100, out=values)
+            growth = values @ np.array([weights[col] for col in columns])
+        else:
+            growth = np.full(len(features_df), 50.0)
         
         # Ensure scores are in 0-100 range
-        scores = pd.Series(np.clip(scores.fillna(50), 0, 100), index=features_df.index)
+        scores = pd.Series(np.clip(growth, 0, 100), index=features_df.index)
         
         logger.info("Calculated growth scores")
         return scores
@@ -139,33 +133,24 @@ def calculate_supply_score(features_df: pd.DataFrame, forecasts: dict) -> pd.Ser
 def calculate_tension_score(features_df: pd.DataFrame, forecasts: dict) -> pd.Series:
     """Calculate market tension score (0-100). High tension = high score."""
     try:
-        scores = pd.Series(index=features_df.index, dtype=float).fillna(50)
-        
         # Use rental market data from features if available
-        tension_factors = []
+        tension = np.full(len(features_df), 50.0)  # Default
         
-        for _, area in features_df.iterrows():
-            area_tension = 50  # Default
-            
-            # Low vacancy rate increases tension score
-            if "vacancy_rate" in area:
-                vacancy = area["vacancy_rate"]
-                if not pd.isna(vacancy):
-                    # Lower vacancy = higher tension (invert scale)
-                    vacancy_score = max(0, 100 - (vacancy / 5) * 100)  # 5% vacancy = 0 points
-                    area_tension = area_tension * 0.5 + vacancy_score * 0.3
-            
-            # High rent growth increases tension score
-            if "rent_growth" in area:
-                rent_growth = area["rent_growth"]
-                if not pd.isna(rent_growth) and rent_growth > 0:
-                    # Scale rent growth to score (5% growth = 100 points)
-                    growth_score = min(100, (rent_growth / 5) * 100)
-                    area_tension = area_tension * 0.7 + growth_score * 0.2
-            
-            tension_factors.append(min(100, max(0, area_tension)))
+        # Low vacancy rate increases tension score
+        if "vacancy_rate" in features_df.columns:
+            vacancy = features_df["vacancy_rate"].to_numpy(dtype=float)
+            # Lower vacancy = higher tension (invert scale)
+            vacancy_score = np.maximum(0, 100 - (vacancy / 5) * 100)  # 5% vacancy = 0 points
+            tension = np.where(np.isnan(vacancy), tension, tension * 0.5 + vacancy_score * 0.3)
+        
+        # High rent growth increases tension score
+        if "rent_growth" in features_df.columns:
+            rent_growth = features_df["rent_growth"].to_numpy(dtype=float)
+            # Scale rent growth to score (5% growth = 100 points)
+            growth_score = np.minimum(100, (rent_growth / 5) * 100)
+            tension = np.where(rent_growth > 0, tension * 0.7 + growth_score * 0.2, tension)
         
-        scores = pd.Series(tension_factors, index=features_df.index)
+        scores = pd.Series(np.clip(tension, 0, 100), index=features_df.index)
         
         logger.info("Calculated tension scores")
         return scores
@@ -200,41 +185,45 @@ def calculate_accessibility_score(features_df: pd.DataFrame) -> pd.Series:
 def calculate_returns_score(features_df: pd.DataFrame, forecasts: dict) -> pd.Series:
     """Calculate rental returns potential score (0-100)."""
     try:
-        scores = pd.Series(index=features_df.index, dtype=float).fillna(50)
-        
-        return_factors = []
-        
-        for _, area in features_df.iterrows():
-            area_return = 50  # Default
-            
-            # Current rent levels (normalized)
-            if "avg_rent" in area:
-                avg_rent = area["avg_rent"]
-                if not pd.isna(avg_rent):
-                    # Scale rent to score (higher rent can mean higher returns)
-                    # But also consider affordability
-                    rent_score = min(100, (avg_rent / 2000) * 60)  # $2000 = 60 points
-                    area_return = area_return * 0.6 + rent_score * 0.2
-            
-            # Rent growth forecast
-            area_name = area.get("area_name", "").replace(" ", "_")
-            for forecast_key, forecast in forecasts.items():
-                if ("rent" in forecast_key.lower() and 
-                    area_name.lower() in forecast_key.lower()):
-                    if forecast.get("forecast"):
-                        # Calculate average rent growth from forecast
-                        current_rent = forecast.get("current_value", 1000)
-                        future_rent = forecast["forecast"][11]["yhat"]  # 12 months out
-                        
-                        if current_rent > 0:
-                            growth_rate = ((future_rent - current_rent) / current_rent) * 100
-                            growth_score = min(100, max(0, growth_rate * 10))  # 10% growth = 100 points
-                            area_return = area_return * 0.8 + growth_score * 0.2
-                        break
-            
-            return_factors.append(min(100, max(0, area_return)))
+        returns = np.full(len(features_df), 50.0)  # Default
+        
+        # Current rent levels (normalized)
+        if "avg_rent" in features_df.columns:
+            avg_rent = features_df["avg_rent"].to_numpy(dtype=float)
+            # Scale rent to score (higher rent can mean higher returns)
+            # But also consider affordability
+            rent_score = np.minimum(100, (avg_rent / 2000) * 60)  # $2000 = 60 points
+            returns = np.where(np.isnan(avg_rent), returns, returns * 0.6 + rent_score * 0.2)
+        
+        # Rent growth forecast: the first rent forecast with data whose key contains the
+        # area name applies; forecasts are scanned once per distinct area, not per row
+        rent_forecasts = [
+            (forecast_key.lower(), forecast) for forecast_key, forecast in forecasts.items()
+            if "rent" in forecast_key.lower() and forecast.get("forecast")
+        ]
+        
+        def forecast_growth_score(area_name: str) -> float:
+            for forecast_key, forecast in rent_forecasts:
+                if area_name in forecast_key:
+                    # Calculate average rent growth from forecast
+                    current_rent = forecast.get("current_value", 1000)
+                    future_rent = forecast["forecast"][11]["yhat"]  # 12 months out
+                    if current_rent > 0:
+                        growth_rate = ((future_rent - current_rent) / current_rent) * 100
+                        return min(100, max(0, growth_rate * 10))  # 10% growth = 100 points
+                    break
+            return np.nan
+        
+        if "area_name" in features_df.columns:
+            area_names = features_df["area_name"].str.replace(" ", "_").str.lower()
+        else:
+            area_names = pd.Series("", index=features_df.index)
+        codes, uniques = pd.factorize(area_names)
+        # Code -1 (missing name) picks the trailing NaN: no forecast applies
+        growth_score = np.append([forecast_growth_score(name) for name in uniques], np.nan)[codes]
+        returns = np.where(np.isnan(growth_score), returns, returns * 0.8 + growth_score * 0.2)
         
-        scores = pd.Series(return_factors, index=features_df.index)
+        scores = pd.Series(np.clip(returns, 0, 100), index=features_df.index)
         
         logger.info("Calculated returns scores")
         return scores
@@ -347,24 +336,19 @@ def main():
     # Save results
     result_df.to_parquet("data/curated/scores.parquet", index=False)
     
-    # Create JSON version for API
-    scores_json = []
-    for _, row in result_df.iterrows():
-        scores_json.append({
+    # Create JSON version for API (records come back as native Python values)
+    score_columns = ["growth", "supply", "tension", "accessibility", "returns", "total"]
+    scores_json = [
+        {
             "area_id": row["area_id"],
             "area_name": row["area_name"],
-            "scores": {
-                "growth": round(row["growth"], 1),
-                "supply": round(row["supply"], 1),
-                "tension": round(row["tension"], 1),
-                "accessibility": round(row["accessibility"], 1),
-                "returns": round(row["returns"], 1),
-                "total": round(row["total"], 1)
-            },
+            "scores": {col: round(row[col], 1) for col in score_columns},
             "quantile": int(row["quantile"]),
             "is_outlier": bool(row["is_outlier"]),
             "last_updated": row["last_updated"]
-        })
+        }
+        for row in result_df.to_dict(orient="records")
+    ]
     
     with open("data/curated/scores.json", "w") as f:
         json.dump(scores_json, f, indent=2)